@@ -0,0 +1,68 @@
+"""
+Compares two benchmark reports written by `benchmarks/run.py`.
+
+    python -m benchmarks.compare base.json head.json [--fail-above 10]
+
+Prints the relative change of throughput and latency percentiles per
+scenario and concurrency level. With `--fail-above`, exits with status 1 when
+any p95 latency got worse by more than that many percent.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+METRICS = ["throughput_rps", "p50_ms", "p95_ms", "p99_ms"]
+
+
+def change(base: float, head: float) -> float | None:
+    if not base:
+        return None
+    return (head - base) / base * 100
+
+
+def format_change(value: float | None) -> str:
+    return "n/a" if value is None else f"{value:+.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", type=Path)
+    parser.add_argument("head", type=Path)
+    parser.add_argument("--fail-above", type=float, help="max allowed p95 regression in percent")
+    args = parser.parse_args(argv)
+
+    base = json.loads(args.base.read_text())
+    head = json.loads(args.head.read_text())
+    base_results = {(r["scenario"], r["concurrency"]): r for r in base["results"]}
+
+    print(f"base {base['meta'].get('revision')} ({base['meta']['mode']}, {base['meta']['parts']} parts) -> "
+          f"head {head['meta'].get('revision')} ({head['meta']['mode']}, {head['meta']['parts']} parts)")
+    print(f"{'scenario':<26} {'c':>4} " + " ".join(f"{metric:>22}" for metric in METRICS))
+
+    regressions = []
+    for result in head["results"]:
+        key = (result["scenario"], result["concurrency"])
+        if key not in base_results:
+            continue
+        previous = base_results[key]
+        cells = [
+            f"{previous[metric]:>8} -> {result[metric]:<8} {format_change(change(previous[metric], result[metric])):>7}"
+            for metric in METRICS
+        ]
+        print(f"{key[0]:<26} {key[1]:>4} " + " ".join(f"{cell:>22}" for cell in cells))
+
+        p95_change = change(previous["p95_ms"], result["p95_ms"])
+        if args.fail_above is not None and p95_change is not None and p95_change > args.fail_above:
+            regressions.append((key, p95_change))
+
+    print(f"peak RSS: {base.get('peak_rss_mb')} MB -> {head.get('peak_rss_mb')} MB")
+    if regressions:
+        for (scenario, concurrency), value in regressions:
+            print(f"REGRESSION {scenario} c={concurrency}: p95 {value:+.1f}%", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
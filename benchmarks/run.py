@@ -0,0 +1,387 @@
+"""
+Benchmarks for the parts API.
+
+Seeds a scratch SQLite database with N parts, then drives every route either
+in-process through an ASGI transport or over HTTP against a uvicorn server,
+at the given concurrency levels. Results are written as JSON so runs can be
+compared between commits with `benchmarks/compare.py`.
+
+    python -m benchmarks.run --parts 10000 --concurrency 1,16 --output base.json
+    python -m benchmarks.run --parts 1000000 --mode uvicorn --requests 2000
+
+`/parts/events` (SSE) and `/parts/ws` are not covered: they are long-lived
+streams without a request latency to measure, and httpx has no WebSocket
+client.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SEED_BATCH_SIZE = 10_000
+
+
+class Scenario:
+    """
+    One route under load. `build` returns (method, url, kwargs) for the n-th
+    request. `background` is a (build, concurrency) load kept running while
+    the scenario is measured.
+    """
+
+    def __init__(self, name: str, build, max_requests: int | None = None, expected=(200,), on_response=None,
+                 background=None):
+        self.name = name
+        self.build = build
+        self.max_requests = max_requests
+        self.expected = expected
+        self.on_response = on_response
+        self.background = background
+
+
+def scenarios(parts: int) -> list[Scenario]:
+    rng = random.Random(42)
+    sequence = itertools.count()
+    created = []
+
+    def random_id(_):
+        return rng.randint(1, parts)
+
+    def part_payload(n):
+        return {
+            "part_number": f"BENCH-NEW-{os.getpid()}-{n}",
+            "description": f"Benchmark part {n}",
+            "price": 10.0 + n % 100,
+            "quantity": n % 500,
+        }
+
+    def create(n):
+        return "POST", "/parts", {"json": part_payload(next(sequence))}
+
+    def remember_created(response):
+        created.append(response.json()["id"])
+
+    def delete(n):
+        part_id = created.pop() if created else random_id(n)
+        return "DELETE", f"/parts/{part_id}", {}
+
+    snapshot_etag = {"value": "*"}
+
+    def remember_snapshot_etag(response):
+        snapshot_etag["value"] = response.headers["ETag"]
+
+    import_csv = ("part_number,price,quantity,description\n" + "".join(
+        f"BENCH-IMPORT-{i:05d},{1 + i % 100}.50,{i % 500},Imported part {i}\n" for i in range(1000)
+    )).encode()
+    imports = []
+
+    def import_status(n):
+        return "GET", f"/imports/{imports[n % len(imports)] if imports else 1}", {}
+
+    return [
+        Scenario("index", lambda n: ("GET", "/", {})),
+        Scenario("list", lambda n: ("GET", "/parts", {"params": {"limit": 100}})),
+        Scenario("list_deep_offset", lambda n: ("GET", "/parts", {
+            "params": {"limit": 100, "offset": max(0, parts - 200), "order_by": "price"}})),
+        Scenario("list_sorted_price", lambda n: ("GET", "/parts", {
+            "params": {"limit": 100, "order_by": "price", "sort": "desc"}})),
+        Scenario("list_price_range", lambda n: ("GET", "/parts", {
+            "params": {"limit": 100, "price_min": 100, "price_max": 200, "order_by": "price"}})),
+        Scenario("list_filter_part_number", lambda n: ("GET", "/parts", {
+            "params": {"part_number": f"{random_id(n):07d}"}})),
+        Scenario("list_prefix", lambda n: ("GET", "/parts", {
+            "params": {"part_number_prefix": f"BENCH-{random_id(n) // 100:05d}"}})),
+        Scenario("list_search", lambda n: ("GET", "/parts", {"params": {"q": "assembly"}})),
+        Scenario("get", lambda n: ("GET", f"/parts/{random_id(n)}", {})),
+        Scenario("get_not_modified", lambda n: ("GET", "/parts/1", {"headers": {"If-None-Match": '"1"'}}),
+                 expected=(200, 304)),
+        Scenario("changes", lambda n: ("GET", "/parts/changes", {"params": {"since": max(0, parts - 100)}})),
+        Scenario("lookup", lambda n: ("POST", "/parts/lookup", {
+            "json": {"part_numbers": [f"BENCH-{random_id(n) - 1:07d}" for _ in range(200)]}})),
+        Scenario("cache_stats", lambda n: ("GET", "/cache/stats", {})),
+        # Served from the cache, then recomputed after every write drops it
+        Scenario("stats", lambda n: ("GET", "/parts/stats", {})),
+        Scenario("stats_after_write", lambda n: ("GET", "/parts/stats", {}), background=(
+            lambda n: ("POST", f"/parts/{random_id(n)}/stock", {"json": {"delta": 1}}), 1)),
+        Scenario("export_ndjson", lambda n: ("GET", "/parts/export", {}), max_requests=5),
+        Scenario("export_csv", lambda n: ("GET", "/parts/export", {"params": {"format": "csv"}}), max_requests=5),
+        # The first request builds the snapshot file, later ones only check for changes
+        Scenario("snapshot", lambda n: ("GET", "/parts/snapshot", {}), max_requests=20,
+                 on_response=remember_snapshot_etag),
+        Scenario("snapshot_not_modified", lambda n: ("GET", "/parts/snapshot", {
+            "headers": {"If-None-Match": snapshot_etag["value"]}}), expected=(304,)),
+        Scenario("create", create, expected=(201,), on_response=remember_created),
+        Scenario("put", lambda n: ("PUT", f"/parts/{random_id(n)}", {"json": part_payload(next(sequence))})),
+        Scenario("patch", lambda n: ("PATCH", f"/parts/{random_id(n)}", {"json": {"price": 12.5}})),
+        Scenario("stock", lambda n: ("POST", f"/parts/{random_id(n)}/stock", {"json": {"delta": 1}})),
+        Scenario("stock_batch", lambda n: ("POST", "/parts/stock", {
+            "json": [{"part_id": random_id(n), "delta": 1} for _ in range(20)]})),
+        Scenario("bulk_upsert", lambda n: ("POST", "/parts/bulk", {
+            "json": [part_payload(next(sequence)) for _ in range(500)]}), max_requests=20),
+        Scenario("delete", delete, expected=(204, 404)),
+        # Upload and queueing only, jobs run in the background (uvicorn mode) or not at all (asgi mode)
+        Scenario("import", lambda n: ("POST", "/imports", {
+            "files": {"file": ("parts.csv", import_csv, "text/csv")}}), max_requests=20, expected=(202,),
+                 on_response=lambda response: imports.append(response.json()["id"])),
+        Scenario("import_status", import_status),
+        # Latency of small reads next to large validation/serialization jobs
+        Scenario("get_during_bulk", lambda n: ("GET", f"/parts/{random_id(n)}", {}), background=(
+            lambda n: ("POST", "/parts/bulk", {"json": [part_payload(next(sequence)) for _ in range(5000)]}), 2)),
+        Scenario("get_during_export", lambda n: ("GET", f"/parts/{random_id(n)}", {}), background=(
+            lambda n: ("GET", "/parts/export", {}), 2)),
+        # Stock writes while deep list pages overload the worker (shed with 503 by admission control)
+        Scenario("stock_during_listing", lambda n: ("POST", f"/parts/{random_id(n)}/stock", {"json": {"delta": 1}}),
+                 background=(lambda n: ("GET", "/parts", {"params": {"limit": 100, "offset": random_id(n)}}), 16)),
+    ]
+
+
+def seed(database: Path, parts: int) -> None:
+    """ Creates the schema and inserts `parts` rows with executemany batches. """
+    from sqlalchemy import create_engine, insert
+
+    from src.database import Base
+    from src.models import Part
+    import src.service  # noqa: F401, registers the search DDL
+
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(engine)
+    started = time.perf_counter()
+    words = ["brake", "assembly", "filter", "pump", "gasket", "valve", "sensor", "bearing"]
+    with engine.begin() as conn:
+        for start in range(0, parts, SEED_BATCH_SIZE):
+            rows = [
+                {
+                    "part_number": f"BENCH-{i:07d}",
+                    "description": f"{words[i % len(words)]} {words[(i // 8) % len(words)]} {i}",
+                    "price": round(1 + (i * 7919) % 100_000 / 100, 2),
+                    "quantity": (i * 104729) % 1000,
+                }
+                for i in range(start, min(start + SEED_BATCH_SIZE, parts))
+            ]
+            conn.execute(insert(Part.__table__), rows)
+    engine.dispose()
+    print(f"Seeded {parts} parts in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    total = min(requests, scenario.max_requests or requests)
+    counter = itertools.count()
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while (n := next(counter)) < total:
+            method, url, kwargs = scenario.build(n)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code not in scenario.expected:
+                errors += 1
+            elif scenario.on_response:
+                scenario.on_response(response)
+
+    done = asyncio.Event()
+
+    async def background_worker(build):
+        n = 0
+        while not done.is_set():
+            method, url, kwargs = build(n)
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            if response.status_code == 503:
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+            n += 1
+
+    background = []
+    if scenario.background is not None:
+        build, background_concurrency = scenario.background
+        background = [asyncio.create_task(background_worker(build)) for _ in range(background_concurrency)]
+        # Measure once the background requests are being handled
+        await asyncio.sleep(0.2)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*background)
+
+    latencies.sort()
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run_all(client, args) -> list[dict]:
+    results = []
+    for scenario in scenarios(args.parts):
+        if args.only and scenario.name not in args.only:
+            continue
+        for concurrency in args.concurrency:
+            result = await run_scenario(client, scenario, args.requests, concurrency)
+            print(f"{result['scenario']:<26} c={concurrency:<4} {result['throughput_rps']:>9} req/s "
+                  f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                  f"errors={result['errors']}", file=sys.stderr)
+            results.append(result)
+    return results
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid: int | None = None) -> float:
+    """ Peak resident set size of this process, or of `pid` while it is alive (Linux). """
+    if pid is None:
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+
+async def run_asgi(args) -> tuple[list[dict], float]:
+    from httpx import AsyncClient, ASGITransport
+
+    from src.main import app
+
+    logging.getLogger().setLevel(logging.WARNING)
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        results = await run_all(client, args)
+    return results, peak_rss_mb()
+
+
+async def run_uvicorn(args, env: dict) -> tuple[list[dict], float]:
+    from httpx import AsyncClient, Limits
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port),
+         "--log-level", "warning", "--no-access-log", "--workers", str(args.workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    # Background loads get their own connections, not a share of the measured ones
+    background = max((scenario.background[1] for scenario in scenarios(args.parts) if scenario.background), default=0)
+    connections = max(args.concurrency) + background
+    limits = Limits(max_connections=connections, max_keepalive_connections=connections)
+    try:
+        async with AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            for _ in range(200):
+                try:
+                    await client.get("/")
+                    break
+                except Exception:
+                    await asyncio.sleep(0.05)
+            else:
+                raise RuntimeError("uvicorn did not start")
+            results = await run_all(client, args)
+            rss = peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+    return results, rss
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parts", type=int, default=10_000, help="parts to seed")
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 16])
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario and concurrency level")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (uvicorn mode)")
+    parser.add_argument("--only", type=lambda v: v.split(","), help="comma separated scenario names")
+    parser.add_argument("--database", type=Path, help="scratch database, seeded if missing")
+    parser.add_argument("--output", type=Path, help="write results as JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    scratch = None
+    if args.database is None:
+        scratch = tempfile.TemporaryDirectory(prefix="partventory-bench-")
+        args.database = Path(scratch.name) / "bench.db"
+
+    # Must be set before `src` is imported, the engine reads it at import time.
+    # Snapshots and uploaded imports go next to the database, not into the tree.
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{args.database}",
+        "PART_SNAPSHOT_PATH": str(args.database.parent / "parts.snapshot"),
+        "PART_IMPORT_DIR": str(args.database.parent / "imports"),
+    }
+    os.environ.update({name: env[name] for name in ("DATABASE_URL", "PART_SNAPSHOT_PATH", "PART_IMPORT_DIR")})
+    sys.path.insert(0, str(ROOT))
+
+    if not args.database.exists():
+        seed(args.database, args.parts)
+
+    if args.mode == "asgi":
+        results, rss = asyncio.run(run_asgi(args))
+    else:
+        results, rss = asyncio.run(run_uvicorn(args, env))
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": args.mode,
+            "parts": args.parts,
+            "requests": args.requests,
+            "workers": args.workers if args.mode == "uvicorn" else None,
+        },
+        "peak_rss_mb": rss,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+    if scratch is not None:
+        scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
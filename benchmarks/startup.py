@@ -0,0 +1,185 @@
+"""
+Startup benchmark for the parts API.
+
+Launches the server the way it is deployed and measures, per run:
+
+    ready_ms          launch until the first response (GET /)
+    all_workers_ms    launch until every worker completed its startup
+    first_request_ms  the first GET /parts/{id} after that
+    second_request_ms the same request again, for comparison
+    pss_mb            proportional memory of the master and workers, i.e.
+                      memory shared between them is counted once
+
+Variants: `uvicorn`, `gunicorn` (preload_app, see gunicorn.conf.py) and
+`gunicorn-no-preload`. Other settings (WARMUP_ENABLED, DOCS_ENABLED, ...)
+are taken from the environment.
+
+    python -m benchmarks.startup --workers 4 --runs 5
+    WARMUP_ENABLED=0 python -m benchmarks.startup --variants gunicorn --output cold.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .run import ROOT, free_port, git_revision, seed
+
+
+VARIANTS = ["uvicorn", "gunicorn", "gunicorn-no-preload"]
+# Logged by every worker once its lifespan startup ran
+STARTUP_COMPLETE = "Application startup complete"
+TIMEOUT = 60
+
+
+def server_command(variant: str, port: int, workers: int) -> tuple[list[str], dict]:
+    if variant == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--workers", str(workers),
+                "--no-access-log"], {}
+    return [sys.executable, "-m", "gunicorn", "src.main:app", "--config", "gunicorn.conf.py"], {
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_PRELOAD": "0" if variant == "gunicorn-no-preload" else "1",
+    }
+
+
+def process_tree(pid: int) -> list[int]:
+    """ `pid` and its descendants (Linux). """
+    pids = [pid]
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        children = (task / "children").read_text().split()
+        for child in children:
+            pids.extend(process_tree(int(child)))
+    return pids
+
+
+def pss_mb(pid: int) -> float:
+    total = 0
+    for process in process_tree(pid):
+        try:
+            with open(f"/proc/{process}/smaps_rollup") as rollup:
+                for line in rollup:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except FileNotFoundError:
+            pass
+    return round(total / 1024, 1)
+
+
+def run_once(variant: str, workers: int, env: dict) -> dict:
+    from httpx import Client, TransportError
+
+    port = free_port()
+    command, variant_env = server_command(variant, port, workers)
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=ROOT, env={**env, **variant_env},
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    startups = []
+
+    def watch_output():
+        for line in server.stdout:
+            if STARTUP_COMPLETE in line:
+                startups.append(time.perf_counter() - started)
+
+    threading.Thread(target=watch_output, daemon=True).start()
+    try:
+        with Client(base_url=f"http://127.0.0.1:{port}", timeout=TIMEOUT) as client:
+            while True:
+                try:
+                    client.get("/").raise_for_status()
+                    break
+                except TransportError:
+                    if server.poll() is not None or time.perf_counter() - started > TIMEOUT:
+                        raise RuntimeError(f"{variant} did not start")
+                    time.sleep(0.005)
+            ready = time.perf_counter() - started
+
+            request_times = []
+            for _ in range(2):
+                request_started = time.perf_counter()
+                client.get("/parts/1").raise_for_status()
+                request_times.append(time.perf_counter() - request_started)
+
+        while len(startups) < workers and time.perf_counter() - started < TIMEOUT:
+            time.sleep(0.005)
+        return {
+            "ready_ms": round(ready * 1000, 1),
+            "all_workers_ms": round(max(startups) * 1000, 1) if len(startups) >= workers else None,
+            "first_request_ms": round(request_times[0] * 1000, 2),
+            "second_request_ms": round(request_times[1] * 1000, 2),
+            "pss_mb": pss_mb(server.pid),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(variant: str, runs: list[dict]) -> dict:
+    """ Median of every measurement over the runs. """
+    result = {"variant": variant, "runs": len(runs)}
+    for key in runs[0]:
+        values = [run[key] for run in runs if run[key] is not None]
+        result[key] = round(statistics.median(values), 2) if values else None
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=lambda v: v.split(","), default=VARIANTS,
+                        help=f"comma separated, of {','.join(VARIANTS)}")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5, help="launches per variant, medians are reported")
+    parser.add_argument("--parts", type=int, default=10_000, help="parts to seed")
+    parser.add_argument("--database", type=Path, help="scratch database, seeded if missing")
+    parser.add_argument("--output", type=Path, help="write results as JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    scratch = None
+    if args.database is None:
+        scratch = tempfile.TemporaryDirectory(prefix="partventory-bench-")
+        args.database = Path(scratch.name) / "bench.db"
+    if not args.database.exists():
+        sys.path.insert(0, str(ROOT))
+        seed(args.database, args.parts)
+
+    # INFO, so worker startups can be seen in the output
+    env = {**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{args.database}", "LOG_LEVEL": "INFO"}
+    results = []
+    for variant in args.variants:
+        result = summarize(variant, [run_once(variant, args.workers, env) for _ in range(args.runs)])
+        print(f"{variant:<20} ready={result['ready_ms']}ms all_workers={result['all_workers_ms']}ms "
+              f"first_request={result['first_request_ms']}ms pss={result['pss_mb']}MB", file=sys.stderr)
+        results.append(result)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "workers": args.workers,
+            "runs": args.runs,
+            "warmup": os.getenv("WARMUP_ENABLED", "1") == "1",
+            "docs": os.getenv("DOCS_ENABLED", "1") == "1",
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+    if scratch is not None:
+        scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
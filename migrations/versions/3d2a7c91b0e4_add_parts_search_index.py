@@ -0,0 +1,71 @@
+"""Add parts search index
+
+Revision ID: 3d2a7c91b0e4
+Revises: 8af9578a9e00
+Create Date: 2026-10-17 09:12:41.530112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d2a7c91b0e4'
+down_revision: Union[str, None] = '8af9578a9e00'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE parts_fts USING fts5(
+                part_number, description,
+                content='parts', content_rowid='id', tokenize='trigram'
+            )
+        """)
+        op.execute("""
+            CREATE TRIGGER parts_fts_ai AFTER INSERT ON parts BEGIN
+                INSERT INTO parts_fts(rowid, part_number, description)
+                VALUES (new.id, new.part_number, new.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER parts_fts_ad AFTER DELETE ON parts BEGIN
+                INSERT INTO parts_fts(parts_fts, rowid, part_number, description)
+                VALUES ('delete', old.id, old.part_number, old.description);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER parts_fts_au AFTER UPDATE OF part_number, description ON parts BEGIN
+                INSERT INTO parts_fts(parts_fts, rowid, part_number, description)
+                VALUES ('delete', old.id, old.part_number, old.description);
+                INSERT INTO parts_fts(rowid, part_number, description)
+                VALUES (new.id, new.part_number, new.description);
+            END
+        """)
+        # Index the rows that already exist
+        op.execute("INSERT INTO parts_fts(parts_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index('ix_parts_part_number_trgm', 'parts', ['part_number'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'part_number': 'gin_trgm_ops'})
+        op.create_index('ix_parts_description_trgm', 'parts', ['description'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'description': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS parts_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS parts_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS parts_fts_ai")
+        op.execute("DROP TABLE IF EXISTS parts_fts")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_parts_description_trgm', table_name='parts')
+        op.drop_index('ix_parts_part_number_trgm', table_name='parts')
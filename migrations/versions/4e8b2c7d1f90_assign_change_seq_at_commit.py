@@ -0,0 +1,81 @@
+"""Assign change seq at commit
+
+Revision ID: 4e8b2c7d1f90
+Revises: b2d94f7a6c31
+Create Date: 2026-10-17 16:02:41.518230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8b2c7d1f90'
+down_revision: Union[str, None] = 'b2d94f7a6c31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite has a single writer, sequence numbers already follow commit order
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("CREATE SEQUENCE IF NOT EXISTS part_changes_pending_seq")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION parts_record_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM part_changes WHERE part_id = OLD.id;
+                INSERT INTO part_changes (seq, part_id, part_number, deleted)
+                    VALUES (-nextval('part_changes_pending_seq'), OLD.id, OLD.part_number, true);
+                RETURN OLD;
+            END IF;
+            DELETE FROM part_changes WHERE part_id = NEW.id;
+            INSERT INTO part_changes (seq, part_id, part_number, deleted)
+                VALUES (-nextval('part_changes_pending_seq'), NEW.id, NEW.part_number, false);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION part_changes_assign_seq() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('part_changes'));
+            UPDATE part_changes SET seq = nextval(pg_get_serial_sequence('part_changes', 'seq'))
+                WHERE part_id = NEW.part_id AND seq < 0;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE CONSTRAINT TRIGGER part_changes_commit_seq AFTER INSERT ON part_changes
+            DEFERRABLE INITIALLY DEFERRED
+            FOR EACH ROW EXECUTE FUNCTION part_changes_assign_seq()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP TRIGGER IF EXISTS part_changes_commit_seq ON part_changes")
+    op.execute("DROP FUNCTION IF EXISTS part_changes_assign_seq()")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION parts_record_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('part_changes'));
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM part_changes WHERE part_id = OLD.id;
+                INSERT INTO part_changes (part_id, part_number, deleted) VALUES (OLD.id, OLD.part_number, true);
+                RETURN OLD;
+            END IF;
+            DELETE FROM part_changes WHERE part_id = NEW.id;
+            INSERT INTO part_changes (part_id, part_number, deleted) VALUES (NEW.id, NEW.part_number, false);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP SEQUENCE IF EXISTS part_changes_pending_seq")
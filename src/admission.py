@@ -0,0 +1,153 @@
+"""
+Admission control: sheds less important requests with `503 Service
+Unavailable` while the worker is overloaded, so the requests that matter
+(stock adjustments, single part reads and writes) keep being served.
+
+Overload is read from three signals, all cheap to sample per request:
+
+    loop lag      how late the event loop runs callbacks (`LoopLagMonitor`)
+    pool wait     how long checkouts from the primary's connection pool take
+    pool waiting  how many callers are waiting for a connection
+
+Each request is given a priority by the name of its route. Low priority
+requests are shed as soon as a signal passes its threshold, normal ones at
+`ADMISSION_NORMAL_FACTOR` times the thresholds, critical ones never.
+"""
+import logging
+import os
+from enum import IntEnum
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from .database import PoolStats, engine, pool_stats
+from .instrumentation import LoopLagMonitor, loop_lag
+
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+# Thresholds past which low priority requests are shed
+ADMISSION_MAX_LOOP_LAG = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "100")) / 1000
+ADMISSION_MAX_POOL_WAIT = float(os.getenv("ADMISSION_MAX_POOL_WAIT_MS", "100")) / 1000
+ADMISSION_MAX_POOL_WAITING = int(os.getenv("ADMISSION_MAX_POOL_WAITING", "10"))
+# Normal priority requests are shed past this multiple of the thresholds
+ADMISSION_NORMAL_FACTOR = float(os.getenv("ADMISSION_NORMAL_FACTOR", "5"))
+# Seconds sent in the Retry-After header of shed requests
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+
+class Priority(IntEnum):
+    LOW = 0
+    NORMAL = 1
+    CRITICAL = 2
+
+
+# Route name -> priority, routes not listed are NORMAL
+ROUTE_PRIORITIES = {
+    "adjust_stock_handler": Priority.CRITICAL,
+    "adjust_stock_batch_handler": Priority.CRITICAL,
+    "metrics_handler": Priority.CRITICAL,
+    "list_parts_handler": Priority.LOW,
+    "export_parts_handler": Priority.LOW,
+    "part_snapshot_handler": Priority.LOW,
+    "part_stats_handler": Priority.LOW,
+    "lookup_parts_handler": Priority.LOW,
+    "bulk_create_parts_handler": Priority.LOW,
+    "create_import_handler": Priority.LOW,
+}
+
+
+class Watchdog:
+    """ Reads the overload signals and decides which priorities are admitted. """
+
+    def __init__(self, loop_lag: LoopLagMonitor, pool: PoolStats | None,
+                 max_loop_lag: float = ADMISSION_MAX_LOOP_LAG, max_pool_wait: float = ADMISSION_MAX_POOL_WAIT,
+                 max_pool_waiting: int = ADMISSION_MAX_POOL_WAITING, normal_factor: float = ADMISSION_NORMAL_FACTOR):
+        self.loop_lag = loop_lag
+        self.pool = pool
+        self.max_loop_lag = max_loop_lag
+        self.max_pool_wait = max_pool_wait
+        self.max_pool_waiting = max_pool_waiting
+        self.normal_factor = normal_factor
+        self.admitted = {priority: 0 for priority in Priority}
+        self.shed = {priority: 0 for priority in Priority}
+        self._shedding = {priority: False for priority in Priority}
+
+    def overload(self) -> float:
+        """ The highest signal as a multiple of its threshold, above 1 when overloaded. """
+        load = self.loop_lag.last / self.max_loop_lag
+        if self.pool is not None:
+            load = max(load, self.pool.wait / self.max_pool_wait, self.pool.waiting / self.max_pool_waiting)
+        return load
+
+    def admit(self, priority: Priority) -> bool:
+        """ Whether to serve a request of `priority` now; counts the decision. """
+        if priority == Priority.CRITICAL:
+            admitted = True
+        else:
+            limit = 1.0 if priority == Priority.LOW else self.normal_factor
+            admitted = self.overload() <= limit
+            if admitted == self._shedding[priority]:
+                # Logged on changes only, shedding can last for thousands of requests
+                self._shedding[priority] = not admitted
+                if admitted:
+                    logger.info("Admitting %s priority requests again", priority.name.lower())
+                else:
+                    logger.warning("Shedding %s priority requests: %s", priority.name.lower(), self.signals())
+        if admitted:
+            self.admitted[priority] += 1
+        else:
+            self.shed[priority] += 1
+        return admitted
+
+    def signals(self) -> str:
+        signals = f"loop lag {self.loop_lag.last * 1000:.0f} ms"
+        if self.pool is not None:
+            signals += f", pool wait {self.pool.wait * 1000:.0f} ms, {self.pool.waiting} waiting"
+        return signals
+
+    def stats(self) -> dict:
+        stats = {"overload": self.overload()}
+        for priority in Priority:
+            name = priority.name.lower()
+            stats[f"{name}_admitted"] = self.admitted[priority]
+            stats[f"{name}_shed"] = self.shed[priority]
+        return stats
+
+
+class AdmissionMiddleware:
+    """
+    Answers requests the watchdog does not admit with 503 and Retry-After,
+    before they are parsed or take a connection. Runs ahead of routing, so
+    it matches `routes` itself to find the route name.
+    """
+
+    def __init__(self, app, routes: list, watchdog: Watchdog, retry_after: int = ADMISSION_RETRY_AFTER):
+        self.app = app
+        self.routes = routes
+        self.watchdog = watchdog
+        self.retry_after = retry_after
+
+    def priority(self, scope) -> Priority:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return ROUTE_PRIORITIES.get(getattr(route, "name", None), Priority.NORMAL)
+        return Priority.NORMAL
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.watchdog.admit(self.priority(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        response = JSONResponse({"detail": "Server is overloaded, retry later"}, status_code=503,
+                                headers={"Retry-After": str(self.retry_after)})
+        await response(scope, receive, send)
+
+
+watchdog = Watchdog(loop_lag, pool_stats(engine))
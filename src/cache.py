@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend:
+    """ Async key/value store holding JSON compatible values. """
+
+    name = "none"
+
+    async def get(self, key: str) -> Any | None:
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        pass
+
+    async def delete(self, key: str) -> None:
+        pass
+
+    async def clear(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+
+class MemoryCache(CacheBackend):
+    """ In-process LRU cache with a time to live. """
+
+    name = "memory"
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache shared by all workers, stored in Redis.
+
+    Needs the `redis` package unless a client with the same async interface
+    is passed in.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str | None = None, ttl: float = 60.0, prefix: str = "partventory:", client=None):
+        if client is None:
+            try:
+                from redis.asyncio import Redis
+            except ImportError as e:
+                raise RuntimeError("The redis cache backend requires the 'redis' package") from e
+            client = Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Any | None:
+        raw = await self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any) -> None:
+        await self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(self.ttl)))
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=self.prefix + "*"):
+            await self.client.delete(key)
+
+
+class PartCache:
+    """
+    Cache of serialized parts keyed by id, counting hits and misses.
+
+    Entries carry the version of the row they were built from, so readers can
+    detect writes made by other workers (see `service.get_part_cached`).
+
+    Also holds the inventory statistics, which are dropped on every write
+    and stored with the change feed position they were computed at, so
+    writes made by other workers are detected as well (see
+    `service.get_part_stats`).
+    """
+
+    def __init__(self, backend: CacheBackend, validate: bool = True):
+        self.backend = backend
+        self.validate = validate
+        # Bumped by `invalidate_stats`, so statistics computed while a write
+        # commits are not stored
+        self.stats_generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend.name != "none"
+
+    async def get(self, part_id: int) -> dict | None:
+        return await self.backend.get(f"part:{part_id}")
+
+    async def set(self, part_id: int, version: str, part: dict) -> None:
+        await self.backend.set(f"part:{part_id}", {"version": version, "part": part})
+
+    async def invalidate(self, *part_ids: int) -> None:
+        for part_id in part_ids:
+            await self.backend.delete(f"part:{part_id}")
+        self.invalidations += len(part_ids)
+
+    async def get_stats(self, key: str, seq: int | None = None) -> dict | None:
+        cached = await self.backend.get("stats")
+        if cached is None or cached["seq"] != seq:
+            return None
+        return cached["entries"].get(key)
+
+    async def set_stats(self, key: str, stats: dict, generation: int, seq: int | None = None) -> None:
+        if generation != self.stats_generation:
+            return
+        cached = await self.backend.get("stats")
+        if cached is None or cached["seq"] != seq:
+            cached = {"seq": seq, "entries": {}}
+        cached["entries"][key] = stats
+        await self.backend.set("stats", cached)
+
+    async def invalidate_stats(self) -> None:
+        self.stats_generation += 1
+        await self.backend.delete("stats")
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "size": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "invalidations": self.invalidations,
+        }
+
+
+def create_backend() -> CacheBackend:
+    backend = os.getenv("PART_CACHE_BACKEND", "memory")
+    ttl = float(os.getenv("PART_CACHE_TTL", "60"))
+    if backend == "memory":
+        return MemoryCache(max_size=int(os.getenv("PART_CACHE_SIZE", "10000")), ttl=ttl)
+    if backend == "redis":
+        return RedisCache(url=os.getenv("PART_CACHE_REDIS_URL", "redis://localhost:6379/0"), ttl=ttl)
+    if backend == "none":
+        return CacheBackend()
+    raise ValueError(f"Unknown PART_CACHE_BACKEND '{backend}'")
+
+
+part_cache = PartCache(
+    create_backend(),
+    validate=os.getenv("PART_CACHE_VALIDATE", "1") == "1",
+)
@@ -0,0 +1,93 @@
+from sqlalchemy import DDL, event
+
+from .models import Part, PartChange
+
+
+# Every write to `parts` moves the part's row in `part_changes` to the next
+# sequence number, so the table holds one row per part and reading changes
+# since a sequence number costs time proportional to what changed. Triggers
+# also catch bulk upserts, stock updates and writes made outside the API.
+# (INSERT OR REPLACE would not do here: inside a trigger, the conflict
+# clause of the outer upsert takes precedence.)
+SQLITE_CHANGES_DDL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS parts_changes_ai AFTER INSERT ON parts BEGIN
+        DELETE FROM part_changes WHERE part_id = new.id;
+        INSERT INTO part_changes (part_id, part_number, deleted) VALUES (new.id, new.part_number, 0);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parts_changes_au AFTER UPDATE ON parts BEGIN
+        DELETE FROM part_changes WHERE part_id = new.id;
+        INSERT INTO part_changes (part_id, part_number, deleted) VALUES (new.id, new.part_number, 0);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parts_changes_ad AFTER DELETE ON parts BEGIN
+        DELETE FROM part_changes WHERE part_id = old.id;
+        INSERT INTO part_changes (part_id, part_number, deleted) VALUES (old.id, old.part_number, 1);
+    END
+    """,
+]
+
+# Readers must never skip a change that commits after a higher sequence
+# number was read, so sequence numbers have to follow commit order. The row
+# trigger records the change under a negative placeholder; a deferred
+# constraint trigger hands out the real number at commit, under a
+# transaction level advisory lock. Writers are only serialized for the
+# moment they commit, not for their whole transaction. SQLite has a single
+# writer and needs none of this.
+POSTGRESQL_CHANGES_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION parts_record_change() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM part_changes WHERE part_id = OLD.id;
+            INSERT INTO part_changes (seq, part_id, part_number, deleted)
+                VALUES (-nextval('part_changes_pending_seq'), OLD.id, OLD.part_number, true);
+            RETURN OLD;
+        END IF;
+        DELETE FROM part_changes WHERE part_id = NEW.id;
+        INSERT INTO part_changes (seq, part_id, part_number, deleted)
+            VALUES (-nextval('part_changes_pending_seq'), NEW.id, NEW.part_number, false);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER parts_changes AFTER INSERT OR UPDATE OR DELETE ON parts
+        FOR EACH ROW EXECUTE FUNCTION parts_record_change()
+    """,
+]
+
+POSTGRESQL_COMMIT_SEQ_DDL = [
+    "CREATE SEQUENCE IF NOT EXISTS part_changes_pending_seq",
+    """
+    CREATE OR REPLACE FUNCTION part_changes_assign_seq() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_advisory_xact_lock(hashtext('part_changes'));
+        UPDATE part_changes SET seq = nextval(pg_get_serial_sequence('part_changes', 'seq'))
+            WHERE part_id = NEW.part_id AND seq < 0;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE CONSTRAINT TRIGGER part_changes_commit_seq AFTER INSERT ON part_changes
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW EXECUTE FUNCTION part_changes_assign_seq()
+    """,
+]
+
+for statement in SQLITE_CHANGES_DDL:
+    event.listen(Part.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRESQL_CHANGES_DDL:
+    event.listen(Part.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in POSTGRESQL_COMMIT_SEQ_DDL:
+    event.listen(PartChange.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+event.listen(Part.__table__, "after_drop",
+             DDL("DROP FUNCTION IF EXISTS parts_record_change()").execute_if(dialect="postgresql"))
+event.listen(PartChange.__table__, "after_drop",
+             DDL("DROP FUNCTION IF EXISTS part_changes_assign_seq()").execute_if(dialect="postgresql"))
+event.listen(PartChange.__table__, "after_drop",
+             DDL("DROP SEQUENCE IF EXISTS part_changes_pending_seq").execute_if(dialect="postgresql"))
@@ -1,34 +1,373 @@
-
+import logging
 import os
+import time
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from fastapi import Request, Response
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue
+
 
+logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./app.db")
+# Comma separated URLs of read replicas of DATABASE_URL
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Seconds a client reads from the primary after its own write
+REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+# Seconds a completed pool checkout wait still counts towards `PoolStats.wait`
+POOL_WAIT_WINDOW = 1.0
+# Seconds a replica that failed to connect is left out before it is tried again
+REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+
+# Handlers that only read and may be served from a replica
+REPLICA_ROUTES = frozenset({"list_parts_handler", "get_part_handler", "lookup_parts_handler", "export_parts_handler"})
+# Holds the time until which the client reads from the primary
+STICKY_COOKIE = "partventory_primary_until"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Applied to every new SQLite connection. WAL lets readers run next to the
+# single writer and busy_timeout makes writers from other gunicorn workers
+# wait for the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-64000"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+
+def engine_options(url: str) -> dict:
+    """
+    Keyword arguments for `create_async_engine`, read from the environment.
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE and
+    DB_POOL_PRE_PING tune the connection pool. For PostgreSQL (asyncpg),
+    DB_STATEMENT_TIMEOUT_MS and DB_APPLICATION_NAME are sent as server
+    settings.
+    """
+    backend = make_url(url).get_backend_name()
+    options = {
+        "echo": os.getenv("DB_ECHO", "0") == "1",
+        "future": True,
+    }
+
+    if backend == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if make_url(url).database in (None, "", ":memory:"):
+            # In-memory databases use a single static connection, no pool to tune
+            return options
+    elif backend == "postgresql":
+        server_settings = {
+            "application_name": os.getenv("DB_APPLICATION_NAME", "partventory"),
+            # JIT compilation only pays off for long analytical queries
+            "jit": "off",
+        }
+        if os.getenv("DB_STATEMENT_TIMEOUT_MS"):
+            server_settings["statement_timeout"] = os.getenv("DB_STATEMENT_TIMEOUT_MS")
+        options["connect_args"] = {"server_settings": server_settings}
+
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "-1" if backend == "sqlite" else "1800")),
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "0" if backend == "sqlite" else "1") == "1",
+    )
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+class PoolStats:
+    """
+    Connection checkouts of one pool: how many callers wait for a connection
+    and for how long.
+    """
+
+    def __init__(self, window: float = POOL_WAIT_WINDOW):
+        self.window = window
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait = 0.0
+        self._recent_wait = 0.0
+        self._recent_at = 0.0
+        self._waiting: dict[int, float] = {}
+        self._next_waiter = 0
+
+    def enter(self) -> int:
+        self._next_waiter += 1
+        self._waiting[self._next_waiter] = time.monotonic()
+        return self._next_waiter
+
+    def leave(self, waiter: int) -> None:
+        now = time.monotonic()
+        waited = now - self._waiting.pop(waiter)
+        self.checkouts += 1
+        self.wait_seconds_total += waited
+        self.max_wait = max(self.max_wait, waited)
+        if now - self._recent_at > self.window:
+            self._recent_wait = 0.0
+        self._recent_wait = max(self._recent_wait, waited)
+        self._recent_at = now
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def wait(self) -> float:
+        """
+        Longest wait of the checkouts in the last `window` seconds, or of the
+        callers still waiting, which covers a pool that hands out nothing.
+        """
+        now = time.monotonic()
+        recent = self._recent_wait if now - self._recent_at <= self.window else 0.0
+        if self._waiting:
+            return max(recent, now - min(self._waiting.values()))
+        return recent
+
+    def stats(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "wait_seconds": self.wait,
+            "checkouts": self.checkouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "max_wait_seconds": self.max_wait,
+        }
+
+
+class TimedQueue(AsyncAdaptedQueue):
+    """
+    Pool queue recording how long callers wait for a connection to be
+    returned. Opening new connections happens outside, so slow connects
+    never count as waiting.
+    """
+
+    stats: PoolStats | None = None
+
+    def get(self, block: bool = True, timeout: float | None = None):
+        if self.stats is None:
+            return super().get(block, timeout)
+        waiter = self.stats.enter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            self.stats.leave(waiter)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """ Queue pool recording its checkouts in `stats`. """
+
+    _queue_class = TimedQueue
+
+    @property
+    def stats(self) -> PoolStats | None:
+        return self._pool.stats
+
+    @stats.setter
+    def stats(self, stats: PoolStats) -> None:
+        self._pool.stats = stats
+
+    def recreate(self) -> "TimedQueuePool":
+        # engine.dispose() swaps in a new pool, the numbers carry over
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def pool_stats(engine: AsyncEngine) -> PoolStats | None:
+    """ Checkout numbers of the engine's pool, None for pools without one (in-memory SQLite). """
+    return getattr(engine.pool, "stats", None)
 
-connect_args = {
-    "check_same_thread": False
-} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
-
-engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL,
-    echo=False,
-    future=True,
-    connect_args=connect_args,
-)
-
-AsyncSessionLocal = sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autoflush=False,
-    autocommit=False,
-)
+
+def create_engine(url: str) -> AsyncEngine:
+    options = engine_options(url)
+    if "pool_size" in options:
+        options["poolclass"] = TimedQueuePool
+    engine = create_async_engine(url, **options)
+    if isinstance(engine.pool, TimedQueuePool):
+        engine.pool.stats = PoolStats()
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+async def log_engine_settings(engine: AsyncEngine) -> None:
+    """ Startup self-check: connects once and logs the effective settings. """
+    pool = engine.pool
+    logger.info("Database %s, pool=%s (%s)",
+                engine.url.render_as_string(hide_password=True), type(pool).__name__, pool.status())
+    async with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            settings = {}
+            for name in SQLITE_PRAGMAS:
+                settings[name] = (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+            logger.info("SQLite pragmas: %s", settings)
+            if str(settings["journal_mode"]).lower() != SQLITE_PRAGMAS["journal_mode"].lower():
+                logger.warning("SQLite journal_mode is '%s', expected '%s'",
+                               settings["journal_mode"], SQLITE_PRAGMAS["journal_mode"])
+        else:
+            version = (await conn.execute(text("SELECT version()"))).scalar()
+            logger.info("Server version: %s", version)
+
+
+def create_sessionmaker(engine: AsyncEngine, replica: bool = False) -> sessionmaker:
+    return sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False,
+        autocommit=False,
+        # Lets the service tell replica reads, which may lag, from primary reads
+        info={"replica": replica},
+    )
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.sessionmaker = create_sessionmaker(engine, replica=True)
+        self.down_until = 0.0
+        self.failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+
+class SessionRouter:
+    """
+    Hands out primary or replica sessions.
+
+    Requests to `REPLICA_ROUTES` read from the replicas in turn. A replica
+    that cannot be connected to is left out for `retry_seconds`; with no
+    replica left, reads go to the primary. Writes set a cookie that sends
+    the client's reads to the primary for `sticky_seconds`, so it sees its
+    own writes despite replication lag.
+    """
+
+    def __init__(self, primary: sessionmaker, replica_engines: list[AsyncEngine] = (),
+                 sticky_seconds: float = REPLICA_STICKY_SECONDS, retry_seconds: float = REPLICA_RETRY_SECONDS):
+        self.primary = primary
+        self.replicas = [Replica(engine) for engine in replica_engines]
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self._next = 0
+        self.replica_reads = 0
+        self.primary_sessions = 0
+        self.fallbacks = 0
+
+    def _healthy_replicas(self) -> list[Replica]:
+        """ Healthy replicas, starting with the next one in turn. """
+        start = self._next % len(self.replicas)
+        self._next += 1
+        rotated = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in rotated if replica.healthy]
+
+    def mark_down(self, replica: Replica, error: Exception) -> None:
+        replica.down_until = time.monotonic() + self.retry_seconds
+        replica.failures += 1
+        logger.warning("Replica %s is down for %.0fs: %s",
+                       replica.engine.url.render_as_string(hide_password=True), self.retry_seconds, str(error))
+
+    async def read_session(self) -> AsyncSession:
+        """ A session on a replica that accepted a connection, else on the primary. """
+        for replica in self._healthy_replicas():
+            session = replica.sessionmaker()
+            try:
+                await session.connection()
+            except (DBAPIError, OSError) as e:
+                await session.close()
+                self.mark_down(replica, e)
+                continue
+            self.replica_reads += 1
+            return session
+        self.fallbacks += 1
+        return self.primary()
+
+    def read_sessionmaker(self) -> sessionmaker:
+        """ Like `read_session`, for handlers that open sessions themselves. Not probed. """
+        healthy = self._healthy_replicas()
+        if healthy:
+            self.replica_reads += 1
+            return healthy[0].sessionmaker
+        self.fallbacks += 1
+        return self.primary
+
+    def is_sticky(self, request: Request) -> bool:
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def stick(self, response: Response) -> None:
+        """ Sends the client's reads to the primary for a while after a write. """
+        until = time.time() + self.sticky_seconds
+        response.set_cookie(STICKY_COOKIE, f"{until:.3f}", max_age=max(1, round(self.sticky_seconds)),
+                            httponly=True, samesite="lax")
+
+    def uses_replica(self, request: Request) -> bool:
+        return bool(self.replicas) and _route_name(request) in REPLICA_ROUTES and not self.is_sticky(request)
+
+    async def session_for(self, request: Request, response: Response) -> AsyncSession:
+        if self.uses_replica(request):
+            return await self.read_session()
+        if self.replicas and request.method not in SAFE_METHODS and _route_name(request) not in REPLICA_ROUTES:
+            self.stick(response)
+        self.primary_sessions += 1
+        return self.primary()
+
+    def sessionmaker_for(self, request: Request) -> sessionmaker:
+        if self.uses_replica(request):
+            return self.read_sessionmaker()
+        return self.primary
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": len(self.replicas),
+            "healthy": sum(replica.healthy for replica in self.replicas),
+            "replica_reads": self.replica_reads,
+            "primary_sessions": self.primary_sessions,
+            "fallbacks": self.fallbacks,
+            "failures": sum(replica.failures for replica in self.replicas),
+        }
+
+
+def _route_name(request: Request) -> str | None:
+    return getattr(request.scope.get("route"), "name", None)
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+AsyncSessionLocal = create_sessionmaker(engine)
+
+session_router = SessionRouter(AsyncSessionLocal, [create_engine(url) for url in DATABASE_REPLICA_URLS])
 
 Base = declarative_base()
 
 
-async def get_session():
-    async with AsyncSessionLocal() as session:
+async def get_session(request: Request, response: Response):
+    """ A replica session for read-only routes (see `SessionRouter`), a primary session otherwise. """
+    async with await session_router.session_for(request, response) as session:
         yield session
+
+
+def get_sessionmaker(request: Request):
+    """ For handlers that open sessions themselves, e.g. while streaming a response. """
+    return session_router.sessionmaker_for(request)
@@ -2,7 +2,9 @@ from typing import Annotated
 
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
 
-from .database import get_session
+from .database import get_session, get_sessionmaker
 
 SessionDep = Annotated[AsyncSession, Depends(get_session)]
+SessionMakerDep = Annotated[sessionmaker, Depends(get_sessionmaker)]
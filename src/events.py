@@ -0,0 +1,277 @@
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from .database import AsyncSessionLocal
+from .models import Part, PartChange
+from .serialization import PART_COLUMNS, dump_part, serialize_part
+
+
+logger = logging.getLogger(__name__)
+
+# Distinct parts waiting to be sent to one subscriber. Events for a part that
+# is already waiting replace the older event; beyond this the oldest waiting
+# part is dropped and the subscriber is told to resync.
+EVENTS_MAX_PENDING = int(os.getenv("PART_EVENTS_MAX_PENDING", "1000"))
+# Seconds between SSE keep-alive comments
+EVENTS_KEEPALIVE = float(os.getenv("PART_EVENTS_KEEPALIVE", "15"))
+# Seconds between polls of `part_changes` (changes broker)
+EVENTS_POLL_INTERVAL = float(os.getenv("PART_EVENTS_POLL_INTERVAL", "1"))
+# Changes read per poll (changes broker)
+EVENTS_POLL_BATCH = 1000
+
+
+class Subscriber:
+    """
+    One client's subscription, with coalesced pending events.
+
+    Subscribes to `part_ids`, to parts whose quantity is below
+    `low_stock_below`, or to every part when neither is given. A part that
+    was reported low and is restocked is reported once more, then no longer.
+    """
+
+    def __init__(self, part_ids: set[int] | None = None, low_stock_below: int | None = None,
+                 max_pending: int = EVENTS_MAX_PENDING):
+        self.part_ids = part_ids
+        self.low_stock_below = low_stock_below
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: OrderedDict[int, dict] = OrderedDict()
+        self._low: set[int] = set()
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def wants(self, event: dict) -> bool:
+        part_id = event["part_id"]
+        if self.part_ids is not None and part_id in self.part_ids:
+            return True
+        if self.low_stock_below is None:
+            return self.part_ids is None
+        if event["deleted"]:
+            return True
+        if event["part"]["quantity"] < self.low_stock_below:
+            self._low.add(part_id)
+            return True
+        if part_id in self._low:
+            self._low.discard(part_id)
+            return True
+        return False
+
+    def offer(self, event: dict) -> None:
+        if not self.wants(event):
+            return
+        part_id = event["part_id"]
+        if part_id in self._pending:
+            self._pending[part_id] = event
+        else:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[part_id] = event
+        self._ready.set()
+
+    async def get(self, timeout: float | None = None) -> list[dict]:
+        """
+        Waits for events and takes all that are pending, oldest first. An
+        `overflow` event comes first when events were dropped. Returns an
+        empty list after `timeout` seconds without events.
+        """
+        if not self._ready.is_set():
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self._ready.clear()
+        events = list(self._pending.values())
+        self._pending.clear()
+        if self.dropped:
+            events.insert(0, {"type": "overflow", "dropped": self.dropped})
+            self.dropped = 0
+        return events
+
+
+class Broker:
+    """ Fans part events out to the subscribers of this worker. """
+
+    name = "memory"
+
+    def __init__(self, max_pending: int = EVENTS_MAX_PENDING):
+        self.max_pending = max_pending
+        self.subscribers: set[Subscriber] = set()
+
+    def subscribe(self, part_ids: set[int] | None = None, low_stock_below: int | None = None) -> Subscriber:
+        subscriber = Subscriber(part_ids, low_stock_below, self.max_pending)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def deliver(self, event: dict) -> None:
+        for subscriber in self.subscribers:
+            subscriber.offer(event)
+
+    def publish(self, part_id: int, part=None) -> None:
+        """ Called after a write commits, with the written part or None for deletes. """
+        if self.subscribers:
+            self.deliver(part_event(part_id, None if part is None else dump_part(part)))
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "broker": self.name,
+            "subscribers": len(self.subscribers),
+            "pending": sum(len(subscriber) for subscriber in self.subscribers),
+        }
+
+
+class ChangeFeedBroker(Broker):
+    """
+    Broker shared by all workers, fed from the `part_changes` table.
+
+    Polls for changes while there are subscribers. Writes in this worker
+    trigger a poll right away; writes in other workers are picked up within
+    `poll_interval` seconds.
+    """
+
+    name = "changes"
+
+    def __init__(self, session_factory: sessionmaker, poll_interval: float = EVENTS_POLL_INTERVAL,
+                 max_pending: int = EVENTS_MAX_PENDING):
+        super().__init__(max_pending)
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self._since: int | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, part_ids: set[int] | None = None, low_stock_below: int | None = None) -> Subscriber:
+        if self._task is None or self._task.done():
+            self._since = None
+            self._task = asyncio.create_task(self._poll_forever())
+        return super().subscribe(part_ids, low_stock_below)
+
+    def publish(self, part_id: int, part=None) -> None:
+        if self.subscribers:
+            self._wakeup.set()
+
+    async def poll(self) -> None:
+        async with self.session_factory() as session:
+            if self._since is None:
+                # Start from now, subscribers only see later changes
+                self._since = await session.scalar(select(func.coalesce(func.max(PartChange.seq), 0)))
+                return
+            result = await session.execute(
+                select(PartChange.seq, PartChange.part_id, PartChange.deleted, *PART_COLUMNS)
+                .outerjoin(Part, Part.id == PartChange.part_id)
+                .where(PartChange.seq > self._since)
+                .order_by(PartChange.seq)
+                .limit(EVENTS_POLL_BATCH)
+            )
+            rows = result.all()
+        for row in rows:
+            self.deliver(part_event(row[1], None if row[2] else serialize_part(row[3:])))
+        if rows:
+            self._since = rows[-1][0]
+            if len(rows) == EVENTS_POLL_BATCH:
+                self._wakeup.set()
+
+    async def _poll_forever(self) -> None:
+        while self.subscribers or self._since is None:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.exception("Polling part changes failed: %s", str(e))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+def part_event(part_id: int, part: dict | None) -> dict:
+    return {"type": "part", "part_id": part_id, "deleted": part is None, "part": part}
+
+
+async def sse_stream(broker: Broker, part_ids: set[int] | None, low_stock_below: int | None,
+                     keepalive: float = EVENTS_KEEPALIVE) -> AsyncIterator[str]:
+    """
+    Subscribes and yields server-sent events until the client goes away.
+    Events are only taken from the subscriber once the previous ones were
+    sent, so a slow client accumulates coalesced events, not a backlog.
+    """
+    subscriber = broker.subscribe(part_ids, low_stock_below)
+    try:
+        while True:
+            events = await subscriber.get(timeout=keepalive)
+            if not events:
+                yield ": keep-alive\n\n"
+            for event in events:
+                yield f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+async def websocket_stream(broker: Broker, part_ids: set[int] | None, low_stock_below: int | None,
+                           websocket: WebSocket) -> None:
+    """
+    Subscribes and sends the events as JSON messages until the client
+    disconnects. Like `sse_stream`, the next events are taken once the
+    previous send completed.
+    """
+    subscriber = broker.subscribe(part_ids, low_stock_below)
+    receiver = asyncio.ensure_future(websocket.receive())
+    getter = None
+    try:
+        while True:
+            getter = asyncio.ensure_future(subscriber.get())
+            await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                # Clients have nothing to say, anything but a disconnect is ignored
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.ensure_future(websocket.receive())
+            if getter.done():
+                for event in getter.result():
+                    await websocket.send_text(json.dumps(event, separators=(",", ":")))
+                getter = None
+            else:
+                getter.cancel()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broker.unsubscribe(subscriber)
+        for task in (receiver, getter):
+            if task is not None:
+                task.cancel()
+
+
+def create_broker() -> Broker:
+    kind = os.getenv("PART_EVENTS_BROKER", "memory")
+    if kind == "memory":
+        return Broker()
+    if kind == "changes":
+        return ChangeFeedBroker(AsyncSessionLocal)
+    raise ValueError(f"Unknown PART_EVENTS_BROKER '{kind}'")
+
+
+broker = create_broker()
@@ -16,3 +16,23 @@ class PartAlreadyExists(Exception):
 
 class PartNotFound(Exception):
     """Raised when a part is not found in the database."""
+
+
+class InvalidCursor(Exception):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+class PartVersionMismatch(Exception):
+    """Raised when a conditional update does not match the current version of a part."""
+
+
+class InsufficientStock(Exception):
+    """Raised when a stock adjustment would make the quantity negative."""
+
+
+class ImportNotFound(Exception):
+    """Raised when an import job is not found in the database."""
+
+
+class InvalidImportFile(Exception):
+    """Raised when an uploaded import file cannot be imported."""
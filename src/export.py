@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import logging
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import Row, select
+
+from .models import Part
+from .offload import offloader
+
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip from the server-side cursor, and per chunk sent
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = ["id", "part_number", "description", "price", "quantity", "version", "created_at", "updated_at"]
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _encode_ndjson(rows: Sequence[Row]) -> bytes:
+    lines = [
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=_json_default, separators=(",", ":"))
+        for row in rows
+    ]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _encode_csv(rows: Sequence[Row]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(value.isoformat() if isinstance(value, datetime) else value for value in row)
+    return buffer.getvalue().encode()
+
+
+ENCODERS = {
+    "ndjson": _encode_ndjson,
+    "csv": _encode_csv,
+}
+
+
+async def export_parts(session_factory, fmt: str) -> AsyncIterator[bytes]:
+    """
+    Streams the whole catalog ordered by id, one encoded chunk per batch.
+
+    Plain column tuples are read from a server-side cursor, so memory use does
+    not depend on the size of the catalog. Full batches are encoded by the
+    offloader, off the event loop.
+    """
+    logger.info("Exporting parts as %s", fmt)
+    encode = ENCODERS[fmt]
+    if fmt == "csv":
+        yield _encode_csv([EXPORT_COLUMNS])
+
+    stmt = (
+        select(*(Part.__table__.c[name] for name in EXPORT_COLUMNS))
+        .order_by(Part.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    exported = 0
+    async with session_factory() as session:
+        result = await session.stream(stmt)
+        async for rows in result.partitions():
+            exported += len(rows)
+            yield await offloader.run(encode, [tuple(row) for row in rows], items=len(rows))
+
+    logger.info("Exported %d parts", exported)
@@ -0,0 +1,369 @@
+import asyncio
+import csv
+import logging
+import os
+import shutil
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, NamedTuple
+
+from pydantic import ValidationError
+from sqlalchemy import Row, and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from .database import AsyncSessionLocal
+from .events import broker
+from .exceptions import ImportNotFound, InvalidImportFile
+from .models import ImportJob, ImportRowError
+from .offload import Offloader
+from .schemas import ImportJobResponse, ImportRowErrorResponse, PartCreate
+from .service import BULK_CHUNK_SIZE, _parts_changed, _upsert_chunk
+
+
+logger = logging.getLogger(__name__)
+
+# Where uploaded files are kept until their import is done. Must be shared
+# by all workers that run imports.
+IMPORT_DIR = os.getenv("PART_IMPORT_DIR", "./imports")
+# Processes parsing and validating files; 0 parses in a thread instead
+IMPORT_WORKERS = int(os.getenv("PART_IMPORT_WORKERS", "1"))
+# Rows parsed, written and committed together, along with the job's progress
+IMPORT_BATCH_SIZE = int(os.getenv("PART_IMPORT_BATCH_SIZE", "2000"))
+# Seconds between looks for new or abandoned jobs
+IMPORT_POLL_INTERVAL = float(os.getenv("PART_IMPORT_POLL_INTERVAL", "5"))
+# A running job without progress for this many seconds is taken over
+IMPORT_STALE_SECONDS = float(os.getenv("PART_IMPORT_STALE_SECONDS", "60"))
+
+REQUIRED_COLUMNS = ("part_number", "price", "quantity")
+
+
+class ParsedBatch(NamedTuple):
+    # (line, PartCreate fields) of the valid rows
+    parts: list[tuple[int, dict]]
+    # (line, part_number, detail) of the invalid rows
+    errors: list[tuple[int, str | None, str]]
+    byte_offset: int
+    last_line: int
+    eof: bool
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _read_header(f) -> list[str]:
+    return [name.strip().lower() for name in next(csv.reader([f.readline()]), [])]
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+
+def parse_batch(path: str, byte_offset: int, last_line: int, max_rows: int) -> ParsedBatch:
+    """
+    Reads up to `max_rows` records of the CSV file at `path`, starting at
+    `byte_offset` (0 for the first record after the header), and validates
+    them against `PartCreate`. Runs in the import worker processes.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = _read_header(f)
+        if byte_offset:
+            f.seek(byte_offset)
+        # Not iterating over the file itself keeps `tell()` usable
+        reader = csv.reader(iter(f.readline, ""))
+        parts, errors = [], []
+        eof = False
+        for _ in range(max_rows):
+            line = last_line + reader.line_num + 1
+            try:
+                values = next(reader)
+            except StopIteration:
+                eof = True
+                break
+            except csv.Error as e:
+                errors.append((line, None, f"Malformed CSV: {e}"))
+                continue
+            if not values:
+                continue
+            if len(values) != len(header):
+                errors.append((line, None, f"Expected {len(header)} columns, got {len(values)}"))
+                continue
+            row = dict(zip(header, values))
+            part_number = row.get("part_number") or None
+            fields = {name: row[name] for name in REQUIRED_COLUMNS}
+            if row.get("description"):
+                fields["description"] = row["description"]
+            try:
+                parts.append((line, PartCreate.model_validate(fields).model_dump()))
+            except ValidationError as e:
+                errors.append((line, part_number, _validation_detail(e)))
+        return ParsedBatch(parts, errors, f.tell(), last_line + reader.line_num, eof)
+
+
+def save_upload(source: BinaryIO, filename: str) -> tuple[str, int]:
+    """ Copies an uploaded file to `IMPORT_DIR` and checks its header. Returns its path and size. """
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_DIR, f"{uuid.uuid4().hex}.csv")
+    with open(path, "wb") as f:
+        shutil.copyfileobj(source, f, 1 << 20)
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            header = _read_header(f)
+    except UnicodeDecodeError:
+        header = None
+    missing = [name for name in REQUIRED_COLUMNS if header is not None and name not in header]
+    if header is None or missing:
+        os.remove(path)
+        detail = f"missing columns {', '.join(missing)}" if header is not None else "not UTF-8 text"
+        raise InvalidImportFile(f"'{filename}' is not an importable CSV file: {detail}")
+    return path, os.path.getsize(path)
+
+
+async def create_import(session: AsyncSession, source: BinaryIO, filename: str, on_conflict: str) -> ImportJob:
+    """ Stores the file and queues its import. """
+    path, size = await asyncio.to_thread(save_upload, source, filename)
+    job = ImportJob(filename=filename, path=path, on_conflict=on_conflict, status="pending", bytes_total=size)
+    session.add(job)
+    await session.commit()
+    logger.info("Import %s queued: %s (%d bytes, on_conflict=%s)", job.id, filename, size, on_conflict)
+    return job
+
+
+async def get_import(session: AsyncSession, job_id: int, errors_after: int = 0,
+                     errors_limit: int = 100) -> ImportJobResponse:
+    """ The job with up to `errors_limit` of its errors after line `errors_after`. """
+    job = await session.get(ImportJob, job_id)
+    if job is None:
+        raise ImportNotFound(f"Import with id '{job_id}' not found")
+    result = await session.execute(
+        select(ImportRowError)
+        .where(ImportRowError.job_id == job_id, ImportRowError.line > errors_after)
+        .order_by(ImportRowError.line)
+        .limit(errors_limit)
+    )
+    response = ImportJobResponse.model_validate(job)
+    response.errors = [ImportRowErrorResponse.model_validate(error) for error in result.scalars()]
+    return response
+
+
+class ImportRunner:
+    """
+    Runs queued imports in the background, one at a time per API worker.
+
+    Jobs are claimed with a conditional update, so with several workers
+    each job runs once. Parsing and validation run in a process pool while
+    the previous batch is written. Every batch is committed together with
+    the job's new `byte_offset`; a job whose worker died (no progress for
+    `stale_seconds`) is taken over and continues after the last committed
+    batch.
+    """
+
+    def __init__(self, session_factory: sessionmaker, workers: int = IMPORT_WORKERS,
+                 batch_size: int = IMPORT_BATCH_SIZE, poll_interval: float = IMPORT_POLL_INTERVAL,
+                 stale_seconds: float = IMPORT_STALE_SECONDS):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self._pid: int | None = None
+        self._worker_id: str | None = None
+        # Every batch goes to the pool, whatever its size
+        if workers > 0:
+            self.offloader = Offloader("process", workers, min_items=0, min_bytes=0)
+        else:
+            self.offloader = Offloader("thread", 1, min_items=0, min_bytes=0)
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def worker_id(self) -> str:
+        """
+        Identifies this runner in `ImportJob.claimed_by`. Made per process: a
+        runner built before gunicorn forks (`preload_app`) gets a new id in
+        each worker, which the claim guards rely on to tell them apart.
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._worker_id = f"{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}"
+        return self._worker_id
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run_forever())
+
+    def wake(self) -> None:
+        """ Looks for jobs right away, after one was queued. """
+        self._wakeup.set()
+
+    async def _parse(self, job: ImportJob, byte_offset: int, last_line: int) -> ParsedBatch:
+        return await self.offloader.run(parse_batch, job.path, byte_offset, last_line, self.batch_size)
+
+    def _claimable(self):
+        stale = _utcnow() - timedelta(seconds=self.stale_seconds)
+        return or_(
+            ImportJob.status == "pending",
+            and_(ImportJob.status == "running", ImportJob.heartbeat_at < stale),
+        )
+
+    async def claim(self) -> ImportJob | None:
+        """ Takes the oldest pending or abandoned job, None when there is none. """
+        async with self.session_factory() as session:
+            while True:
+                job_id = await session.scalar(
+                    select(ImportJob.id).where(self._claimable()).order_by(ImportJob.id).limit(1)
+                )
+                if job_id is None:
+                    return None
+                result = await session.execute(
+                    update(ImportJob)
+                    .where(ImportJob.id == job_id, self._claimable())
+                    .values(status="running", claimed_by=self.worker_id, heartbeat_at=_utcnow())
+                )
+                await session.commit()
+                if result.rowcount == 1:
+                    return await session.get(ImportJob, job_id, populate_existing=True)
+
+    async def _write(self, job: ImportJob, batch: ParsedBatch) -> list[Row] | None:
+        """
+        Writes a batch and the job's progress in one transaction. Returns the
+        written parts, None when another worker took the job over.
+        """
+        # Later rows of the file win over earlier ones with the same part number
+        latest = {}
+        for line, fields in batch.parts:
+            latest[fields["part_number"]] = (line, fields)
+        pending = sorted(latest.values(), key=lambda item: item[0])
+
+        async with self.session_factory() as session:
+            rows, written = [], []
+            for start in range(0, len(pending), BULK_CHUNK_SIZE):
+                chunk_rows, chunk_written = await _upsert_chunk(
+                    session, pending[start:start + BULK_CHUNK_SIZE], job.on_conflict
+                )
+                rows.extend(chunk_rows)
+                written.extend(chunk_written)
+
+            errors = [
+                ImportRowError(job_id=job.id, line=line, part_number=part_number, detail=detail)
+                for line, part_number, detail in batch.errors
+            ]
+            errors.extend(
+                ImportRowError(job_id=job.id, line=row.index, part_number=row.part_number, detail=row.detail)
+                for row in rows if row.status == "rejected"
+            )
+            session.add_all(errors)
+
+            progress = {
+                "byte_offset": batch.byte_offset,
+                "last_line": batch.last_line,
+                "rows_processed": ImportJob.rows_processed + len(batch.parts) + len(batch.errors),
+                "created": ImportJob.created + sum(row.status == "created" for row in rows),
+                "updated": ImportJob.updated + sum(row.status == "updated" for row in rows),
+                "rejected": ImportJob.rejected + len(errors),
+                "heartbeat_at": _utcnow(),
+            }
+            if batch.eof:
+                progress.update(status="done", finished_at=_utcnow())
+            result = await session.execute(
+                update(ImportJob)
+                .where(ImportJob.id == job.id, ImportJob.claimed_by == self.worker_id)
+                .values(**progress)
+            )
+            if result.rowcount != 1:
+                await session.rollback()
+                return None
+            await session.commit()
+        return written
+
+    async def _fail(self, job: ImportJob, error: str) -> None:
+        async with self.session_factory() as session:
+            await session.execute(
+                update(ImportJob)
+                .where(ImportJob.id == job.id, ImportJob.claimed_by == self.worker_id)
+                .values(status="failed", error=error, finished_at=_utcnow())
+            )
+            await session.commit()
+
+    async def run(self, job: ImportJob) -> None:
+        logger.info("Import %s started at byte %d of %d", job.id, job.byte_offset, job.bytes_total)
+        parsing = asyncio.ensure_future(self._parse(job, job.byte_offset, job.last_line))
+        try:
+            while True:
+                try:
+                    batch = await parsing
+                except Exception as e:
+                    logger.exception("Import %s failed reading the file: %s", job.id, str(e))
+                    await self._fail(job, f"The file could not be read: {e}")
+                    return
+                if not batch.eof:
+                    # Parse the next batch while this one is written
+                    parsing = asyncio.ensure_future(self._parse(job, batch.byte_offset, batch.last_line))
+                try:
+                    written = await self._write(job, batch)
+                except Exception as e:
+                    logger.exception("Import %s failed writing lines up to %d: %s", job.id, batch.last_line, str(e))
+                    await self._fail(job, "An unexpected error occurred while writing the parts")
+                    return
+                if written is None:
+                    logger.warning("Import %s was taken over by another worker", job.id)
+                    return
+                await _parts_changed(*(part.id for part in written))
+                for part in written:
+                    broker.publish(part.id, part)
+                if batch.eof:
+                    break
+        finally:
+            parsing.cancel()
+
+        logger.info("Import %s done", job.id)
+        try:
+            await asyncio.to_thread(os.remove, job.path)
+        except FileNotFoundError:
+            pass
+
+    async def run_pending(self) -> int:
+        """ Runs jobs until none is left to claim. Returns how many ran. """
+        count = 0
+        while (job := await self.claim()) is not None:
+            try:
+                await self.run(job)
+            except asyncio.CancelledError:
+                await asyncio.shield(self._release(job))
+                raise
+            count += 1
+        return count
+
+    async def _release(self, job: ImportJob) -> None:
+        """ Hands an interrupted job back, so the next worker resumes it right away. """
+        async with self.session_factory() as session:
+            await session.execute(
+                update(ImportJob)
+                .where(ImportJob.id == job.id, ImportJob.claimed_by == self.worker_id, ImportJob.status == "running")
+                .values(status="pending", claimed_by=None)
+            )
+            await session.commit()
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_pending()
+            except Exception as e:
+                logger.exception("Running imports failed: %s", str(e))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.offloader.close()
+
+
+import_runner = ImportRunner(AsyncSessionLocal)
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+
+
+logger = logging.getLogger(__name__)
+
+# Off by default: without it no middleware, route or engine listener is installed
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+# Queries slower than this are logged at WARNING, 0 disables the log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Milliseconds between event loop lag probes
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50")) / 1000
+
+
+class Histogram:
+    """ Prometheus style histogram with one series per label tuple. """
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [count per bucket..., count in +Inf, sum]
+        self._series: dict[tuple, list[float]] = {}
+
+    def observe(self, label_values: tuple, value: float) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self._series.items()):
+            labels = ",".join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            bucket_labels = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{bucket_labels}le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{bucket_labels}le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+class Metrics:
+    def __init__(self):
+        labels = ("method", "route", "status")
+        self.request_duration = Histogram(
+            "partventory_http_request_duration_seconds", "Time spent handling requests.",
+            labels, LATENCY_BUCKETS)
+        self.request_db_duration = Histogram(
+            "partventory_http_request_db_duration_seconds", "Time spent in database queries per request.",
+            labels, LATENCY_BUCKETS)
+        self.request_queries = Histogram(
+            "partventory_http_request_db_queries", "Database queries per request.",
+            labels, QUERY_COUNT_BUCKETS)
+        self.histograms = [self.request_duration, self.request_db_duration, self.request_queries]
+        self.queries_total = 0
+        self.slow_queries_total = 0
+        self._collectors = []
+
+    def add_histogram(self, histogram: Histogram) -> None:
+        self.histograms.append(histogram)
+
+    def add_collector(self, prefix: str, collect) -> None:
+        """ Exposes the numbers returned by `collect()` (a dict) as `<prefix>_<key>`. """
+        self._collectors.append((prefix, collect))
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        lines.extend([
+            "# TYPE partventory_db_queries_total counter",
+            f"partventory_db_queries_total {self.queries_total}",
+            "# TYPE partventory_db_slow_queries_total counter",
+            f"partventory_db_slow_queries_total {self.slow_queries_total}",
+        ])
+        for prefix, collect in self._collectors:
+            for key, value in collect().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{key} untyped")
+                    lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how much later than asked a sleeping task is
+    woken up. That is how long ready callbacks, e.g. other requests, wait
+    behind code that holds the loop.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.histogram = Histogram(
+            "partventory_event_loop_lag_seconds", "Delay of event loop wake-ups.", (), LOOP_LAG_BUCKETS)
+        self.last = 0.0
+        self.max = 0.0
+        self._task: asyncio.Task | None = None
+
+    def record(self, lag: float) -> None:
+        self.last = lag
+        self.max = max(self.max, lag)
+        self.histogram.observe((), lag)
+
+    async def _probe_forever(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._probe_forever())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "last_seconds": self.last,
+            "max_seconds": self.max,
+        }
+
+
+loop_lag = LoopLagMonitor()
+
+
+def instrument_engine(engine: AsyncEngine, metrics: Metrics | None, slow_query_ms: float) -> None:
+    """ Times every query, adding it to the current request's stats. """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+        if metrics is not None:
+            metrics.queries_total += 1
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            if metrics is not None:
+                metrics.slow_queries_total += 1
+            logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement)
+
+
+class InstrumentationMiddleware:
+    """
+    Records per-route duration, query count and query time, and reports them
+    in a `Server-Timing` header.
+    """
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = time.perf_counter() - started
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries", '
+                    f"app;dur={(elapsed - stats.db_time) * 1000:.2f}, "
+                    f"total;dur={elapsed * 1000:.2f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            labels = (scope["method"], route.path if route is not None else "unmatched", str(status_code))
+            self.metrics.request_duration.observe(labels, time.perf_counter() - started)
+            self.metrics.request_db_duration.observe(labels, stats.db_time)
+            self.metrics.request_queries.observe(labels, stats.queries)
+
+
+def instrument(app: FastAPI, engines: list[AsyncEngine], slow_query_ms: float = SLOW_QUERY_MS) -> Metrics:
+    """
+    Installs the middleware, the `/metrics` endpoint and the engine
+    listeners. `loop_lag` must be started from the lifespan.
+    """
+    metrics = Metrics()
+    metrics.add_histogram(loop_lag.histogram)
+    metrics.add_collector("partventory_event_loop_lag", loop_lag.stats)
+    for engine in engines:
+        instrument_engine(engine, metrics, slow_query_ms)
+    app.add_middleware(InstrumentationMiddleware, metrics=metrics)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_handler():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    return metrics
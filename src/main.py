@@ -1,28 +1,102 @@
-import logging
-import sys
+import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 
-from .routers import router
+from .admission import ADMISSION_ENABLED, AdmissionMiddleware, watchdog
+from .cache import part_cache
+from .database import AsyncSessionLocal, engine, log_engine_settings, pool_stats, session_router
+from .events import broker
+from .imports import import_runner
+from .instrumentation import METRICS_ENABLED, SLOW_QUERY_MS, instrument, instrument_engine, loop_lag
+from .log import configure_logging
+from .offload import offloader
+from .routers import imports_router, router
+from .service import list_flight, part_flight, warm_up
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-    ],
-)
+# Set to 0 in production to serve neither /docs, /redoc nor /openapi.json
+DOCS_ENABLED = os.getenv("DOCS_ENABLED", "1") == "1"
+# Does at startup what the first requests would otherwise pay for
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
 
-app = FastAPI()
+log_listener = configure_logging()
+
+engines = [engine, *(replica.engine for replica in session_router.replicas)]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for db_engine in engines:
+        await log_engine_settings(db_engine)
+    if WARMUP_ENABLED:
+        async with AsyncSessionLocal() as session:
+            await warm_up(session)
+    import_runner.start()
+    if METRICS_ENABLED or ADMISSION_ENABLED:
+        loop_lag.start()
+    yield
+    await loop_lag.close()
+    await import_runner.close()
+    offloader.close()
+    await broker.close()
+    await session_router.dispose()
+    await engine.dispose()
+
+
+docs = {} if DOCS_ENABLED else {"openapi_url": None, "docs_url": None, "redoc_url": None}
+app = FastAPI(lifespan=lifespan, **docs)
 app.include_router(router)
+app.include_router(imports_router)
+
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, routes=app.routes, watchdog=watchdog)
+
+if METRICS_ENABLED:
+    metrics = instrument(app, engines)
+    metrics.add_collector("partventory_part_cache", part_cache.stats)
+    metrics.add_collector("partventory_events", broker.stats)
+    metrics.add_collector("partventory_offload", offloader.stats)
+    metrics.add_collector("partventory_database_routing", session_router.stats)
+    if pool_stats(engine) is not None:
+        metrics.add_collector("partventory_db_pool", pool_stats(engine).stats)
+    if ADMISSION_ENABLED:
+        metrics.add_collector("partventory_admission", watchdog.stats)
+    metrics.add_collector("partventory_single_flight_get_part", part_flight.stats)
+    metrics.add_collector("partventory_single_flight_list_parts", list_flight.stats)
+elif os.getenv("SLOW_QUERY_MS"):
+    for db_engine in engines:
+        instrument_engine(db_engine, None, SLOW_QUERY_MS)
 
 
 @app.get("/")
 async def index(request: Request):
+    if not DOCS_ENABLED:
+        return {"message": "Welcome to the Partventory"}
     base_url = str(request.base_url).rstrip("/")
     return {
         "message": "Welcome to the Partventory",
         "docs": f"{base_url}/docs",
         "redoc": f"{base_url}/redoc",
     }
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return part_cache.stats()
+
+
+def warm_up_app(app: FastAPI) -> None:
+    """
+    Builds the OpenAPI schema and the middleware stack, which FastAPI and
+    Starlette otherwise build on the first request that needs them. Runs at
+    import, so with gunicorn's `preload_app` it is done once in the master
+    and the forked workers start with the result.
+    """
+    if DOCS_ENABLED:
+        app.openapi()
+    app.middleware_stack = app.build_middleware_stack()
+
+
+if WARMUP_ENABLED:
+    warm_up_app(app)
@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, DateTime, func
+from sqlalchemy import BigInteger, Boolean, Column, ForeignKey, Index, Integer, String, Text, Numeric, DateTime, func
 
 from .database import Base
 
 
 class Part(Base):
     __tablename__ = "parts"
+    __table_args__ = (
+        # One per `order_by` column, with `id` as the tie breaker, so range
+        # filters and sorted pages are index range scans
+        Index("ix_parts_price_id", "price", "id"),
+        Index("ix_parts_quantity_id", "quantity", "id"),
+        Index("ix_parts_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     part_number = Column(String(length=255), unique=True, index=True, nullable=False)
@@ -12,6 +19,78 @@ class Part(Base):
     price = Column(Numeric(10, 2), nullable=False)
     quantity = Column(Integer, nullable=False)
     internal_note = Column(Text, nullable=True) # Added afterwards to test alembic
+    # Bumped by every write, served as the ETag
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, onupdate=func.now(), nullable=True)
+
+
+# When a part last changed: parts that were never updated count from their
+# creation. `updated_since` and `order_by=updated_at` use it, so they are
+# range scans of one index.
+PART_CHANGED_AT = func.coalesce(Part.updated_at, Part.created_at)
+Index("ix_parts_changed_at_id", PART_CHANGED_AT, Part.id)
+
+
+class PartChange(Base):
+    """
+    Latest change of every part, filled by database triggers (see
+    `changes.py`). Each write moves the part's row to a new `seq`, deletes
+    leave a tombstone.
+    """
+    __tablename__ = "part_changes"
+    # AUTOINCREMENT on SQLite, so sequence numbers are never reused
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    part_id = Column(Integer, unique=True, nullable=False)
+    part_number = Column(String(length=255), nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False, server_default="0")
+    changed_at = Column(DateTime, server_default=func.now())
+
+
+class ImportJob(Base):
+    """
+    A CSV file being imported in the background (see `imports.py`).
+    Everything before `byte_offset` is written, a resumed job continues
+    from there.
+    """
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True)
+    filename = Column(String(length=255), nullable=False)
+    path = Column(Text, nullable=False)
+    on_conflict = Column(String(length=16), nullable=False)
+    # pending, running, done or failed
+    status = Column(String(length=16), nullable=False, index=True)
+    error = Column(Text, nullable=True)
+
+    bytes_total = Column(BigInteger, nullable=False)
+    byte_offset = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Last line of the file read, for the line numbers of errors after a resume
+    last_line = Column(Integer, nullable=False, default=1, server_default="1")
+    rows_processed = Column(Integer, nullable=False, default=0, server_default="0")
+    created = Column(Integer, nullable=False, default=0, server_default="0")
+    updated = Column(Integer, nullable=False, default=0, server_default="0")
+    rejected = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Worker running the job, and when it last made progress
+    claimed_by = Column(String(length=255), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+
+
+class ImportRowError(Base):
+    """ A row of an import that was rejected, by its line in the file. """
+    __tablename__ = "import_errors"
+    __table_args__ = (
+        Index("ix_import_errors_job_id_line", "job_id", "line"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=False)
+    line = Column(Integer, nullable=False)
+    part_number = Column(String(length=255), nullable=True)
+    detail = Column(Text, nullable=False)
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# "inline" runs everything on the event loop, "thread" or "process" sends
+# large jobs to a pool of that kind. Validation and encoding hold the GIL, so
+# only a process pool keeps them from delaying the event loop.
+OFFLOAD_MODE = os.getenv("OFFLOAD_MODE", "process")
+OFFLOAD_WORKERS = int(os.getenv("OFFLOAD_WORKERS", "2"))
+# Jobs with fewer items and fewer bytes than this run on the event loop,
+# where they cost less than the hand-off
+OFFLOAD_MIN_ITEMS = int(os.getenv("OFFLOAD_MIN_ITEMS", "1000"))
+OFFLOAD_MIN_BYTES = int(os.getenv("OFFLOAD_MIN_BYTES", "131072"))
+
+
+class Offloader:
+    """
+    Runs CPU-heavy jobs (validation, serialization) off the event loop once
+    they are large enough to delay other requests.
+
+    With a process pool, the function and its arguments must be picklable
+    and what it returns is copied back, so jobs should take and return
+    plain data or bytes.
+    """
+
+    def __init__(self, mode: str = OFFLOAD_MODE, workers: int = OFFLOAD_WORKERS,
+                 min_items: int = OFFLOAD_MIN_ITEMS, min_bytes: int = OFFLOAD_MIN_BYTES):
+        if mode not in ("inline", "thread", "process"):
+            raise ValueError(f"Unknown OFFLOAD_MODE '{mode}'")
+        self.mode = mode
+        self.workers = workers
+        self.min_items = min_items
+        self.min_bytes = min_bytes
+        self._executor: Executor | None = None
+        self.inline = 0
+        self.offloaded = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                # Not forked: the children would inherit the event loop and open connections
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="offload")
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args, items: int = 0, size: int = 0) -> T:
+        """ Calls `func(*args)`, in the pool when `items` or `size` (bytes) reach the thresholds. """
+        if self.mode == "inline" or (items < self.min_items and size < self.min_bytes):
+            self.inline += 1
+            return func(*args)
+        self.offloaded += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool:
+            self._executor = None
+            raise
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "inline": self.inline,
+            "offloaded": self.offloaded,
+        }
+
+
+offloader = Offloader()
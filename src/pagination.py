@@ -0,0 +1,98 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy import Column, DateTime, Integer, Numeric, and_, bindparam, or_
+from sqlalchemy.dialects import sqlite
+
+from .exceptions import InvalidCursor
+
+
+# SQLite stores `func.now()` defaults as 'YYYY-MM-DD HH:MM:SS'. Datetimes
+# compared with those columns (cursor values, filters) have to be bound in
+# the same format, otherwise string comparison treats '... 10:00:00' and
+# '... 10:00:00.000000' as different values.
+ComparableDateTime = DateTime().with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite")
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _load_value(column: Column, value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Numeric):
+        return Decimal(value)
+    if isinstance(column.type, Integer):
+        return int(value)
+    return value
+
+
+def encode_cursor(row: Any, order_by: str, sort: str) -> str:
+    """ Builds an opaque cursor pointing right after `row`. """
+    value = getattr(row, order_by)
+    if order_by == "updated_at" and value is None:
+        # Pages are ordered by coalesce(updated_at, created_at)
+        value = row.created_at
+    payload = {
+        "o": order_by,
+        "s": sort,
+        "v": _dump_value(value),
+        "id": row.id,
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: str, sort: str, column: Column) -> tuple[Any, int]:
+    """ Returns the (value, id) pair stored in a cursor created for the same ordering. """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["o"] != order_by or payload["s"] != sort:
+            raise InvalidCursor("Cursor does not match the requested ordering")
+        return _load_value(column, payload["v"]), int(payload["id"])
+    except InvalidCursor:
+        raise
+    except (binascii.Error, ValueError, KeyError, TypeError, ArithmeticError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def keyset_clause(column: Column, id_column: Column, value: Any, last_id: int,
+                  descending: bool, nulls_first: bool):
+    """
+    Builds the WHERE clause selecting rows after (value, last_id) for
+    `ORDER BY column, id` in the given direction.
+
+    `nulls_first` describes where the backend puts NULLs in ascending order
+    (first on SQLite, last on PostgreSQL), so the ordering keeps using the
+    plain column indexes.
+    """
+    id_after = id_column < last_id if descending else id_column > last_id
+    if column is id_column:
+        return id_after
+
+    # NULLs come before every value when they sort first in the scan direction.
+    nulls_before = nulls_first != descending
+    if value is None:
+        if nulls_before:
+            return or_(and_(column.is_(None), id_after), column.is_not(None))
+        return and_(column.is_(None), id_after)
+
+    if isinstance(column.type, DateTime):
+        value = bindparam(None, value, type_=ComparableDateTime)
+    value_after = column < value if descending else column > value
+    clause = or_(value_after, and_(column == value, id_after))
+    if getattr(column, "nullable", False) and not nulls_before:
+        clause = or_(clause, column.is_(None))
+    return clause
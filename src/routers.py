@@ -1,23 +1,117 @@
-from typing import Annotated
-from fastapi import APIRouter, HTTPException, Query, status
+from datetime import datetime
+from typing import Annotated, Literal
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Request, Response, UploadFile, WebSocket, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
 
-from .dependencies import SessionDep
-from .schemas import PartCreate, PartPartialUpdate, PartResponse, PartFilters, PartUpdate
-from .service import create_part, delete_part, get_part, list_parts, update_part
-from .exceptions import PartAlreadyExists, PartCreationError, PartDeletionError, PartNotFound, PartUpdateError
+from .dependencies import SessionDep, SessionMakerDep
+from .events import broker, sse_stream, websocket_stream
+from .export import MEDIA_TYPES, export_parts
+from .imports import create_import, get_import, import_runner
+from .pagination import encode_cursor
+from .offload import offloader
+from .serialization import RawJSONResponse, render_model, render_part, render_parts, validate_bulk_parts
+from .snapshot import MEDIA_TYPE as SNAPSHOT_MEDIA_TYPE, SNAPSHOT_PATH, iter_file, read_snapshot_file, refresh_snapshot
+from .schemas import (
+    BULK_MAX_PARTS, ImportJobResponse, PartBulkResult, PartChangeBatch, PartCreate, PartLookup, PartLookupResult, PartPartialUpdate, PartResponse,
+    PartFilters, PartStats, PartUpdate, StockAdjustment, StockAdjustmentItem, StockBatchResult,
+)
+from .service import (
+    adjust_stock, adjust_stock_batch, bulk_upsert_parts, create_part, delete_part, get_part_cached, get_part_stats,
+    list_changes, list_parts, lookup_parts, update_part,
+)
+from .exceptions import (
+    ImportNotFound, InsufficientStock, InvalidCursor, InvalidImportFile, PartAlreadyExists, PartCreationError, PartDeletionError, PartNotFound,
+    PartUpdateError, PartVersionMismatch,
+)
 
 
 router = APIRouter(prefix="/parts", tags=["parts"])
+imports_router = APIRouter(prefix="/imports", tags=["imports"])
+
+LOOKUP_MAX_KEYS = 1_000
+STOCK_BATCH_MAX_ITEMS = 1_000
+
+
+def etag(value) -> str:
+    return f'"{value}"'
+
+
+def part_tag(version: int, created_at: datetime | str) -> str:
+    """
+    Entity tag of a part: its version and creation time, the same identity
+    the part cache checks. Ids of deleted parts can be reused, so the
+    version alone would match a recreated part.
+    """
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return f"{version}-{created_at.isoformat()}"
+
+
+def etag_values(header: str, weak: bool) -> list[str] | None:
+    """
+    Parses an `If-Match`/`If-None-Match` header into the tags' values, None for `*`.
+
+    Weak tags only count when `weak` comparison is allowed (`If-None-Match`).
+    """
+    if header.strip() == "*":
+        return None
+    values = []
+    for tag in header.split(","):
+        tag = tag.strip()
+        if weak:
+            tag = tag.removeprefix("W/")
+        if len(tag) > 2 and tag[0] == tag[-1] == '"':
+            values.append(tag[1:-1])
+    return values
+
+
+def part_versions(values: list[str]) -> list[tuple[int, datetime]]:
+    """ The (version, created_at) pairs of the values of `part_tag` tags, others are skipped. """
+    versions = []
+    for value in values:
+        version, _, created_at = value.partition("-")
+        try:
+            versions.append((int(version), datetime.fromisoformat(created_at)))
+        except ValueError:
+            continue
+    return versions
 
 
 @router.get("", response_model=list[PartResponse])
 async def list_parts_handler(
     session: SessionDep,
-    filters: Annotated[PartFilters, Query()]
+    filters: Annotated[PartFilters, Query()],
 ):
-    """ List parts. """
-    parts = await list_parts(session=session, filters=filters)
-    return parts
+    """
+    List parts.
+
+    When a page is full, the `X-Next-Cursor` header holds the cursor of the
+    next page. Passing it back as `cursor` (with the same `order_by` and
+    `sort`) continues the scan right after the last returned part.
+
+    `q` runs a ranked substring search over part numbers and descriptions;
+    its results are paged with `offset`.
+
+    With `include_total`, the `X-Total-Count` header holds the number of
+    matching parts. For very large unfiltered tables it is an estimate, which
+    is flagged with `X-Total-Count-Estimated: true`.
+    """
+    try:
+        parts, total = await list_parts(session=session, filters=filters)
+    except InvalidCursor as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    response = RawJSONResponse(render_parts(parts))
+    if len(parts) == filters.limit and not filters.q:
+        response.headers["X-Next-Cursor"] = encode_cursor(parts[-1], filters.order_by, filters.sort)
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total.count)
+        if total.estimated:
+            response.headers["X-Total-Count-Estimated"] = "true"
+    return response
 
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=PartResponse)
@@ -37,25 +131,190 @@ async def create_part_handler(part: PartCreate, session: SessionDep):
         )
 
 
-@router.get("/{part_id}", response_model=PartResponse)
-async def get_part_handler(part_id: int, session: SessionDep):
-    """ Gets a part by ID. """
+@router.post("/bulk", response_model=PartBulkResult, openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {
+            "type": "array", "items": {"$ref": "#/components/schemas/PartCreate"}, "maxItems": BULK_MAX_PARTS,
+        }}},
+    },
+})
+async def bulk_create_parts_handler(
+    request: Request,
+    response: Response,
+    session: SessionDep,
+    on_conflict: Literal["update", "reject"] = "update",
+):
+    """
+    Creates or updates many parts at once, matched by `part_number`.
+
+    Reports the outcome of every row in request order.
+    """
+    # Validated here rather than by FastAPI, so large bodies are validated off the event loop
+    body = await request.body()
+    parts, errors = await offloader.run(validate_bulk_parts, body, size=len(body))
+    if errors is not None:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in errors], body=body)
+    result = await bulk_upsert_parts(parts, session, on_conflict)
+    # Encoded here: a model costs more to send to a worker process than to encode
+    rendered = RawJSONResponse(render_model(result))
+    # FastAPI drops headers set on `response` (the sticky cookie) when a response is returned
+    rendered.raw_headers.extend(response.headers.raw)
+    return rendered
+
+
+@router.post("/lookup", response_model=PartLookupResult)
+async def lookup_parts_handler(lookup: PartLookup, session: SessionDep):
+    """
+    Fetches many parts by id and/or exact part number in one request.
+
+    Every requested key gets a row, in request order (ids first), with
+    `found: false` and no part when it does not exist.
+    """
+    if len(lookup.ids) + len(lookup.part_numbers) > LOOKUP_MAX_KEYS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {LOOKUP_MAX_KEYS} ids and part numbers can be looked up at once"
+        )
+    result = await lookup_parts(lookup, session)
+    return RawJSONResponse(render_model(result))
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_parts_handler(
+    session_factory: SessionMakerDep,
+    fmt: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+):
+    """ Streams every part as newline delimited JSON or CSV. """
+    return StreamingResponse(
+        export_parts(session_factory, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="parts.{fmt}"'},
+    )
+
+
+@router.get("/snapshot", response_class=StreamingResponse, responses={304: {"description": "Not Modified"}})
+async def part_snapshot_handler(
+    session_factory: SessionMakerDep,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    Serves id, part number, price and quantity of every part as a packed
+    columnar file (layout documented in `src/snapshot.py`), meant to be saved
+    and memory-mapped. The snapshot is first brought up to date with the
+    changes since it was last refreshed. The ETag is the `part_changes`
+    sequence number the snapshot is current with.
+    """
+    await refresh_snapshot(session_factory, SNAPSHOT_PATH)
+    f, size, seq = read_snapshot_file(SNAPSHOT_PATH)
+    headers = {"ETag": etag(seq), "X-Snapshot-Seq": str(seq)}
+    if if_none_match:
+        values = etag_values(if_none_match, weak=True)
+        if values is None or str(seq) in values:
+            f.close()
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return StreamingResponse(
+        iter_file(f),
+        media_type=SNAPSHOT_MEDIA_TYPE,
+        headers={**headers, "Content-Length": str(size), "Content-Disposition": 'attachment; filename="parts.snapshot"'},
+    )
+
+
+@router.get("/changes", response_model=PartChangeBatch)
+async def list_changes_handler(
+    session: SessionDep,
+    since: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(gt=0, le=1000)] = 100,
+):
+    """
+    Lists what changed after the `since` sequence number, oldest first.
+
+    Start with `since=0`, then pass back `next_since` while `has_more` is
+    true. Storing the last `next_since` makes the next sync resume there.
+    Deleted parts are reported with `deleted: true`.
+    """
+    return await list_changes(session, since, limit)
+
+
+@router.get("/events", response_class=StreamingResponse)
+async def part_events_handler(
+    part_id: Annotated[list[int] | None, Query()] = None,
+    low_stock_below: Annotated[int | None, Query(gt=0)] = None,
+):
+    """
+    Streams part changes as server-sent events.
+
+    Subscribes to the given `part_id`s, to parts whose quantity drops below
+    `low_stock_below`, or to every part. Each `part` event holds the part's
+    new state (`deleted: true` and no part for deletes). A client that falls
+    behind only receives the latest state of each part; if too many parts
+    are waiting, an `overflow` event tells it to refetch what it watches.
+    """
+    return StreamingResponse(
+        sse_stream(broker, set(part_id) if part_id else None, low_stock_below),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def part_events_websocket(
+    websocket: WebSocket,
+    part_id: Annotated[list[int] | None, Query()] = None,
+    low_stock_below: Annotated[int | None, Query(gt=0)] = None,
+):
+    """ The events of `GET /parts/events` as JSON messages over a WebSocket. """
+    await websocket.accept()
+    await websocket_stream(broker, set(part_id) if part_id else None, low_stock_below, websocket)
+
+
+@router.get("/stats", response_model=PartStats)
+async def part_stats_handler(
+    session: SessionDep,
+    low_stock_threshold: Annotated[int, Query(gt=0)] = 10,
+):
+    """
+    Inventory value (`price * quantity`), stock counts and a quantity
+    histogram. Parts with less than `low_stock_threshold` (but some) stock are
+    counted as low stock.
+    """
+    return await get_part_stats(session, low_stock_threshold)
+
+
+@router.get("/{part_id}", response_model=PartResponse, responses={304: {"description": "Not Modified"}})
+async def get_part_handler(
+    part_id: int,
+    session: SessionDep,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """ Gets a part by ID. Answers 304 when `If-None-Match` holds the current ETag. """
     try:
-        return await get_part(part_id, session)
+        part = await get_part_cached(part_id, session)
     except PartNotFound as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
-    
+
+    tag = part_tag(part["version"], part["created_at"])
+    if if_none_match:
+        values = etag_values(if_none_match, weak=True)
+        if values is None or tag in values:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag(tag)})
+    return RawJSONResponse(render_part(part), headers={"ETag": etag(tag)})
+
 async def try_update_part(
         part_id: int,
         part: PartUpdate | PartPartialUpdate,
         session: SessionDep,
-        partial: bool
+        partial: bool,
+        response: Response,
+        if_match: str | None,
     ):
+    values = etag_values(if_match, weak=False) if if_match else None
+    expected_versions = None if values is None else part_versions(values)
     try:
-        return await update_part(part_id, part, session, partial)
+        updated_part = await update_part(part_id, part, session, partial, expected_versions)
     except PartNotFound as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -66,21 +325,42 @@ async def try_update_part(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except PartVersionMismatch as e:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=str(e)
+        )
     except PartUpdateError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+    response.headers["ETag"] = etag(part_tag(updated_part.version, updated_part.created_at))
+    return updated_part
 
 
 @router.put("/{part_id}", response_model=PartResponse)
-async def put_part_handler(part_id: int, part: PartUpdate, session: SessionDep):
-    return await try_update_part(part_id, part, session, partial=False)
+async def put_part_handler(
+    part_id: int,
+    part: PartUpdate,
+    session: SessionDep,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    """ Replaces a part. With `If-Match`, only if the part still has that ETag (412 otherwise). """
+    return await try_update_part(part_id, part, session, False, response, if_match)
 
 
 @router.patch("/{part_id}", response_model=PartResponse)
-async def patch_part_handler(part_id: int, part: PartPartialUpdate, session: SessionDep):
-    return await try_update_part(part_id, part, session, partial=True)
+async def patch_part_handler(
+    part_id: int,
+    part: PartPartialUpdate,
+    session: SessionDep,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    """ Updates some fields of a part. With `If-Match`, only if the part still has that ETag (412 otherwise). """
+    return await try_update_part(part_id, part, session, True, response, if_match)
     
 
 @router.delete("/{part_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -98,3 +378,86 @@ async def delete_part_handler(part_id: int, session: SessionDep):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+
+
+@router.post("/stock", response_model=StockBatchResult)
+async def adjust_stock_batch_handler(
+    adjustments: Annotated[list[StockAdjustmentItem], Body(max_length=STOCK_BATCH_MAX_ITEMS)],
+    session: SessionDep,
+):
+    """ Adds signed deltas to the stock of many parts in one statement. """
+    try:
+        return await adjust_stock_batch(adjustments, session)
+    except PartUpdateError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.post("/{part_id}/stock", response_model=PartResponse)
+async def adjust_stock_handler(part_id: int, adjustment: StockAdjustment, session: SessionDep):
+    """ Adds a signed delta to the stock of a part, refusing to go below zero. """
+    try:
+        return await adjust_stock(part_id, adjustment.delta, session)
+    except PartNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except InsufficientStock as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except PartUpdateError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@imports_router.post("", status_code=status.HTTP_202_ACCEPTED, response_model=ImportJobResponse)
+async def create_import_handler(
+    file: UploadFile,
+    session: SessionDep,
+    response: Response,
+    on_conflict: Literal["update", "reject"] = "update",
+):
+    """
+    Queues the import of a CSV file with `part_number`, `price`, `quantity`
+    and optionally `description` columns (in any order, other columns are
+    ignored). Existing part numbers are updated or rejected like in
+    `POST /parts/bulk`. Poll the returned job for progress.
+    """
+    try:
+        job = await create_import(session, file.file, file.filename or "upload.csv", on_conflict)
+    except InvalidImportFile as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    import_runner.wake()
+    response.headers["Location"] = f"/imports/{job.id}"
+    return ImportJobResponse.model_validate(job)
+
+
+@imports_router.get("/{job_id}", response_model=ImportJobResponse)
+async def get_import_handler(
+    job_id: int,
+    session: SessionDep,
+    errors_after: Annotated[int, Query(ge=0)] = 0,
+    errors_limit: Annotated[int, Query(gt=0, le=1000)] = 100,
+):
+    """
+    Progress of an import (`byte_offset` of `bytes_total`), its counts and
+    the rejected rows by line. Pass the last returned line as
+    `errors_after` to page through the errors.
+    """
+    try:
+        return await get_import(session, job_id, errors_after, errors_limit)
+    except ImportNotFound as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
@@ -1,8 +1,12 @@
 
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Literal, Optional
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, field_validator, model_validator
+
+
+# Most parts accepted by one bulk request
+BULK_MAX_PARTS = 10_000
 
 
 class PaginationParams(BaseModel):
@@ -10,14 +14,44 @@ class PaginationParams(BaseModel):
     offset: int = Field(0, ge=0)
     order_by: Literal["id", "created_at", "updated_at"] = "id"
     sort: Literal["asc", "desc"] = "asc"
+    cursor: str | None = Field(default=None)
+
+    @model_validator(mode="after")
+    def check_cursor_without_offset(self):
+        if self.cursor and self.offset:
+            raise ValueError("offset cannot be combined with cursor")
+        return self
 
 
 class PartFilters(PaginationParams):
     order_by: Literal["id", "price", "quantity", "created_at", "updated_at"] = "id"
 
+    q: str | None = Field(default=None, max_length=255)
     part_number: str | None = Field(default=None)
+    part_number_prefix: str | None = Field(default=None, min_length=1)
     description: str | None = Field(default=None)
     quantity: int | None = Field(default=None, ge=0)
+    quantity_gt: int | None = Field(default=None, ge=0)
+    quantity_lt: int | None = Field(default=None, ge=0)
+    price_min: float | None = Field(default=None, ge=0)
+    price_max: float | None = Field(default=None, ge=0)
+    updated_since: datetime | None = Field(default=None)
+
+    include_total: bool = False
+
+    @field_validator("updated_since")
+    @classmethod
+    def to_naive_utc(cls, value: datetime | None):
+        # Timestamps are stored as naive UTC
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    @model_validator(mode="after")
+    def check_cursor_without_search(self):
+        if self.cursor and self.q:
+            raise ValueError("q cannot be combined with cursor")
+        return self
 
 
 class PartBase(BaseModel):
@@ -34,6 +68,7 @@ class PartCreate(PartBase):
 class PartUpdate(PartCreate):
     pass
 
+
 class PartPartialUpdate(BaseModel):
     part_number: Optional[str] = None
     description: Optional[str] = None
@@ -45,5 +80,118 @@ class PartResponse(PartBase):
     model_config = ConfigDict(from_attributes=True)
 
     id: int
+    version: int
     created_at: datetime
     updated_at: datetime | None = None
+
+
+class PartChangeResponse(BaseModel):
+    seq: int
+    part_id: int
+    part_number: str
+    deleted: bool
+    changed_at: datetime | None = None
+    # Current state of the part, None for deletes
+    part: PartResponse | None = None
+
+
+class PartChangeBatch(BaseModel):
+    changes: list[PartChangeResponse] = []
+    next_since: int
+    has_more: bool = False
+
+
+class PartLookup(BaseModel):
+    ids: list[int] = []
+    part_numbers: list[str] = []
+
+
+class PartLookupRow(BaseModel):
+    # The requested key, either `id` or `part_number`
+    id: int | None = None
+    part_number: str | None = None
+    found: bool
+    part: PartResponse | None = None
+
+
+class PartLookupResult(BaseModel):
+    found: int = 0
+    not_found: int = 0
+    rows: list[PartLookupRow] = []
+
+
+class PartBulkRow(BaseModel):
+    index: int
+    part_number: str
+    status: Literal["created", "updated", "rejected"]
+    detail: str | None = None
+
+
+class PartBulkResult(BaseModel):
+    created: int = 0
+    updated: int = 0
+    rejected: int = 0
+    rows: list[PartBulkRow] = []
+
+
+class StockAdjustment(BaseModel):
+    delta: int
+
+
+class StockAdjustmentItem(StockAdjustment):
+    part_id: int
+
+
+class StockRejection(BaseModel):
+    part_id: int
+    detail: str
+
+
+class StockBatchResult(BaseModel):
+    applied: list[PartResponse] = []
+    rejected: list[StockRejection] = []
+
+
+class QuantityBucket(BaseModel):
+    min: int
+    max: int | None = None
+    count: int
+
+
+class PartStats(BaseModel):
+    parts: int
+    total_quantity: int
+    inventory_value: float
+    out_of_stock: int
+    low_stock: int
+    low_stock_threshold: int
+    quantity_histogram: list[QuantityBucket]
+
+
+class ImportRowErrorResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    line: int
+    part_number: str | None = None
+    detail: str
+
+
+class ImportJobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    filename: str
+    on_conflict: Literal["update", "reject"]
+    status: Literal["pending", "running", "done", "failed"]
+    error: str | None = None
+    bytes_total: int
+    # Bytes of the file read and written so far
+    byte_offset: int
+    rows_processed: int
+    created: int
+    updated: int
+    rejected: int
+    created_at: datetime | None = None
+    finished_at: datetime | None = None
+    # Rejected rows after `errors_after`, by line
+    errors: list[ImportRowErrorResponse] = []
@@ -0,0 +1,126 @@
+import sys
+
+from sqlalchemy import DDL, String, and_, event, func, literal_column, or_, select, table, column
+
+from .models import Part
+
+
+# SQLite keeps an external content FTS5 table next to `parts`. The trigram
+# tokenizer matches substrings, so it serves both ranked `q=` searches and the
+# `LIKE '%term%'` filters. PostgreSQL uses pg_trgm GIN indexes instead, which
+# the planner picks up for plain ILIKE predicates.
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS parts_fts USING fts5(
+        part_number, description,
+        content='parts', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parts_fts_ai AFTER INSERT ON parts BEGIN
+        INSERT INTO parts_fts(rowid, part_number, description)
+        VALUES (new.id, new.part_number, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parts_fts_ad AFTER DELETE ON parts BEGIN
+        INSERT INTO parts_fts(parts_fts, rowid, part_number, description)
+        VALUES ('delete', old.id, old.part_number, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS parts_fts_au AFTER UPDATE OF part_number, description ON parts BEGIN
+        INSERT INTO parts_fts(parts_fts, rowid, part_number, description)
+        VALUES ('delete', old.id, old.part_number, old.description);
+        INSERT INTO parts_fts(rowid, part_number, description)
+        VALUES (new.id, new.part_number, new.description);
+    END
+    """,
+]
+
+POSTGRESQL_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_parts_part_number_trgm ON parts USING gin (part_number gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_parts_description_trgm ON parts USING gin (description gin_trgm_ops)",
+]
+
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Part.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRESQL_SEARCH_DDL:
+    event.listen(Part.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+event.listen(Part.__table__, "before_drop", DDL("DROP TABLE IF EXISTS parts_fts").execute_if(dialect="sqlite"))
+
+
+parts_fts = table(
+    "parts_fts",
+    column("rowid"),
+    column("part_number", String),
+    column("description", String),
+    column("rank"),
+)
+
+# Trigram indexes only help for terms of at least three characters
+MIN_TRIGRAM_LENGTH = 3
+
+
+def prefix_clause(prefix: str):
+    """
+    Matches part numbers starting with `prefix` as a range predicate, which
+    is served by `ix_parts_part_number` on every backend (SQLite never uses
+    an index for case-insensitive LIKE).
+    """
+    # Trailing U+10FFFF cannot be incremented. Every string starting with the
+    # rest is below the rest incremented, so the bound comes from that.
+    stripped = prefix.rstrip(chr(sys.maxunicode))
+    if not stripped:
+        return Part.part_number >= prefix
+    code = ord(stripped[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        # Surrogates cannot be encoded, the next character is U+E000
+        code = 0xE000
+    upper = stripped[:-1] + chr(code)
+    return and_(Part.part_number >= prefix, Part.part_number < upper)
+
+
+def contains_clause(dialect: str, column_name: str, term: str):
+    """ Substring filter on `part_number` or `description`. """
+    pattern = f"%{term}%"
+    if dialect == "sqlite":
+        matches = select(parts_fts.c.rowid).where(parts_fts.c[column_name].like(pattern))
+        return Part.id.in_(matches)
+    return getattr(Part, column_name).ilike(pattern)
+
+
+def _fts_query(terms: list[str]) -> str:
+    # Every term is quoted, so user input can never be read as FTS5 syntax
+    return " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _terms_clause(terms: list[str]):
+    return and_(*(
+        or_(Part.part_number.ilike(f"%{term}%"), Part.description.ilike(f"%{term}%"))
+        for term in terms
+    ))
+
+
+def apply_search(stmt, dialect: str, q: str):
+    """ Restricts `stmt` to parts matching every term of `q`, best matches first. """
+    terms = q.split()
+    if not terms:
+        return stmt
+
+    if dialect == "sqlite" and all(len(term) >= MIN_TRIGRAM_LENGTH for term in terms):
+        return (
+            stmt.join(parts_fts, parts_fts.c.rowid == Part.id)
+            .where(literal_column("parts_fts").op("MATCH")(_fts_query(terms)))
+            .order_by(parts_fts.c.rank, Part.id)
+        )
+
+    if dialect == "postgresql":
+        rank = func.greatest(
+            func.word_similarity(q, Part.part_number),
+            func.word_similarity(q, func.coalesce(Part.description, "")),
+        )
+        return stmt.where(_terms_clause(terms)).order_by(rank.desc(), Part.id)
+
+    return stmt.where(_terms_clause(terms)).order_by(Part.id)
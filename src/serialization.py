@@ -0,0 +1,74 @@
+from collections.abc import Sequence
+from typing import Annotated
+
+from pydantic import Field, TypeAdapter, ValidationError
+from pydantic_core import to_json
+from sqlalchemy import Row
+from starlette.responses import Response
+
+from .models import Part
+from .schemas import BULK_MAX_PARTS, PartCreate, PartResponse
+
+
+# Columns selected for responses, in `PartResponse` field order. Selecting
+# plain columns skips ORM instances and their identity map bookkeeping.
+PART_FIELDS = tuple(PartResponse.model_fields)
+PART_COLUMNS = tuple(Part.__table__.c[name] for name in PART_FIELDS)
+
+part_adapter = TypeAdapter(PartResponse)
+part_list_adapter = TypeAdapter(list[PartResponse])
+bulk_parts_adapter = TypeAdapter(Annotated[list[PartCreate], Field(max_length=BULK_MAX_PARTS)])
+
+
+class RawJSONResponse(Response):
+    """
+    JSON response for content that is already encoded.
+
+    Handlers declare `response_model` for the OpenAPI schema but return this,
+    so FastAPI neither validates nor encodes the content a second time.
+    """
+
+    media_type = "application/json"
+
+
+def part_row_to_dict(row: Row) -> dict:
+    return dict(zip(PART_FIELDS, row))
+
+
+def render_parts(rows: Sequence[Row]) -> bytes:
+    """ Validates rows of `PART_COLUMNS` in one pass and encodes them as a JSON array. """
+    parts = part_list_adapter.validate_python([dict(zip(PART_FIELDS, row)) for row in rows])
+    return part_list_adapter.dump_json(parts)
+
+
+def serialize_part(row: Row) -> dict:
+    """ A row of `PART_COLUMNS` as the JSON compatible dict of a `PartResponse`. """
+    return part_adapter.dump_python(part_adapter.validate_python(part_row_to_dict(row)), mode="json")
+
+
+def dump_part(part) -> dict:
+    """ An ORM `Part` or a `RETURNING` row as the JSON compatible dict of a `PartResponse`. """
+    return part_adapter.dump_python(part_adapter.validate_python(part, from_attributes=True), mode="json")
+
+
+def render_part(part: dict) -> bytes:
+    """ Encodes a dict returned by `serialize_part`. """
+    return to_json(part)
+
+
+def validate_bulk_parts(body: bytes) -> tuple[list[dict] | None, list[dict] | None]:
+    """
+    Parses and validates the body of a bulk request. Returns the fields of
+    the parts as dicts, or the validation errors (a ValidationError does not
+    survive pickling). Plain dicts are several times cheaper to copy back
+    from a worker process than models.
+    """
+    try:
+        return bulk_parts_adapter.dump_python(bulk_parts_adapter.validate_json(body)), None
+    except ValidationError as e:
+        return None, e.errors(include_url=False)
+
+
+def render_model(model) -> bytes:
+    """ Encodes a response model that was built by the service, without validating it again. """
+    return model.__pydantic_serializer__.to_json(model)
@@ -1,53 +1,251 @@
 import logging
+import os
+from collections import Counter
+from datetime import datetime
+from typing import NamedTuple
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import asc, desc, select
+from sqlalchemy import Row, and_, asc, bindparam, case, delete, desc, false, func, insert, or_, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
 
 
-from .models import Part
-from .schemas import PartCreate, PartFilters
-from .exceptions import PartAlreadyExists, PartCreationError, PartDeletionError, PartNotFound, PartUpdateError
+from .cache import part_cache
+from .events import broker
+from .models import PART_CHANGED_AT, Part, PartChange
+from .schemas import (
+    PaginationParams, PartBulkResult, PartBulkRow, PartChangeBatch, PartChangeResponse, PartCreate, PartFilters,
+    PartLookup, PartLookupResult, PartResponse, PartStats, QuantityBucket, StockAdjustmentItem, StockBatchResult,
+    StockRejection,
+)
+from .pagination import ComparableDateTime, decode_cursor, keyset_clause
+from .serialization import PART_COLUMNS, part_row_to_dict, serialize_part
+from .search import apply_search, contains_clause, prefix_clause
+from .singleflight import SingleFlight
+from . import changes  # noqa: F401, registers the change feed triggers
+from .exceptions import (
+    InsufficientStock, PartAlreadyExists, PartCreationError, PartDeletionError, PartNotFound, PartUpdateError,
+    PartVersionMismatch,
+)
 
 
 logger = logging.getLogger(__name__)
 
+# Rows per INSERT ... ON CONFLICT executemany and per transaction in bulk writes
+BULK_CHUNK_SIZE = 500
 
-async def list_parts(session: AsyncSession, filters: PartFilters) -> list[Part]:
-    logger.info("Fetching all parts with filters: %s", filters)
-    stmt = select(Part)
+_DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
 
-    # Filtering
+# Keys per IN (...) list in lookups
+LOOKUP_CHUNK_SIZE = 500
+
+# Unfiltered totals above this many rows are estimated from table statistics
+COUNT_ESTIMATE_THRESHOLD = int(os.getenv("PART_COUNT_ESTIMATE_THRESHOLD", "1000000"))
+
+# Lower bounds of the quantity histogram buckets in `get_part_stats`
+QUANTITY_HISTOGRAM_BOUNDS = (0, 1, 10, 100, 1000)
+
+_FILTER_FIELDS = tuple(
+    name for name in PartFilters.model_fields
+    if name not in PaginationParams.model_fields and name != "include_total"
+)
+
+
+# Identical concurrent reads share one query
+part_flight = SingleFlight()
+list_flight = SingleFlight()
+
+
+class PartTotal(NamedTuple):
+    count: int
+    estimated: bool = False
+
+
+async def _parts_changed(*part_ids: int) -> None:
+    """ Drops what is cached about the written parts, after the commit. """
+    for part_id in part_ids:
+        part_flight.forget((part_id, False))
+        part_flight.forget((part_id, True))
+    list_flight.forget()
+    await part_cache.invalidate(*part_ids)
+    await part_cache.invalidate_stats()
+
+
+def _on_replica(session: AsyncSession) -> bool:
+    return session.info.get("replica", False)
+
+
+def _apply_filters(stmt, dialect: str, filters: PartFilters):
     if filters.part_number:
-        stmt = stmt.where(Part.part_number.ilike(f"%{filters.part_number}%"))
+        stmt = stmt.where(contains_clause(dialect, "part_number", filters.part_number))
+    if filters.part_number_prefix:
+        stmt = stmt.where(prefix_clause(filters.part_number_prefix))
     if filters.description:
-        stmt = stmt.where(Part.description.ilike(f"%{filters.description}%"))
+        stmt = stmt.where(contains_clause(dialect, "description", filters.description))
     if filters.quantity is not None:
         stmt = stmt.where(Part.quantity == filters.quantity)
+    if filters.quantity_gt is not None:
+        stmt = stmt.where(Part.quantity > filters.quantity_gt)
+    if filters.quantity_lt is not None:
+        stmt = stmt.where(Part.quantity < filters.quantity_lt)
+    if filters.price_min is not None:
+        stmt = stmt.where(Part.price >= filters.price_min)
+    if filters.price_max is not None:
+        stmt = stmt.where(Part.price <= filters.price_max)
+    if filters.updated_since is not None:
+        stmt = stmt.where(PART_CHANGED_AT >= bindparam(None, filters.updated_since, type_=ComparableDateTime))
+    return stmt
+
+
+async def _estimate_part_count(session: AsyncSession, dialect: str) -> int | None:
+    """ Row count of `parts` from the planner's statistics, None if there are none. """
+    if dialect == "postgresql":
+        estimate = await session.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'parts'::regclass")
+        )
+        # -1 until the table has been vacuumed or analyzed
+        return estimate if estimate is not None and estimate >= 0 else None
+    if dialect == "sqlite":
+        has_stats = await session.scalar(
+            text("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        )
+        if has_stats:
+            stat = await session.scalar(text("SELECT stat FROM sqlite_stat1 WHERE tbl = 'parts' LIMIT 1"))
+            if stat:
+                return int(stat.split()[0])
+        # The largest rowid is read from the end of the b-tree
+        return await session.scalar(select(func.max(Part.id)))
+    return None
+
+
+async def _count_parts(session: AsyncSession, dialect: str, filters: PartFilters) -> PartTotal:
+    """ Counts the parts matching `filters`, ignoring pagination. """
+    stmt = _apply_filters(select(Part.id), dialect, filters)
+    if filters.q:
+        stmt = apply_search(stmt, dialect, filters.q).order_by(None)
+    return PartTotal(await session.scalar(select(func.count()).select_from(stmt.subquery())))
+
+
+async def list_parts(session: AsyncSession, filters: PartFilters) -> tuple[list[Row], PartTotal | None]:
+    """
+    Returns rows of `PART_COLUMNS`, and with `include_total` the number of
+    parts matching the filters. Concurrent calls with equal filters share
+    one query.
+    """
+    key = (tuple(sorted(filters.model_dump().items())), _on_replica(session))
+    return await list_flight.do(key, lambda: _list_parts(session, filters))
+
+
+async def _list_parts(session: AsyncSession, filters: PartFilters) -> tuple[list[Row], PartTotal | None]:
+    """
+    Runs the list query for `list_parts`.
+
+    In offset mode the total comes from a `count(*) OVER ()` column of the
+    page query itself. Cursor pages and pages past the end are counted with a
+    second query. Without filters, tables larger than
+    `COUNT_ESTIMATE_THRESHOLD` are estimated from the table statistics.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        # Records are formatted later on the log thread, so only immutable arguments
+        logger.debug("Fetching parts: %s", " ".join(
+            f"{name}={value}" for name, value in filters.model_dump(exclude_defaults=True).items()
+        ) or "no filters")
+    dialect = session.get_bind().dialect.name
+    total = None
+    if filters.include_total and all(getattr(filters, name) is None for name in _FILTER_FIELDS):
+        estimate = await _estimate_part_count(session, dialect)
+        if estimate is not None and estimate >= COUNT_ESTIMATE_THRESHOLD:
+            total = PartTotal(estimate, estimated=True)
+    if filters.include_total and total is None and filters.cursor:
+        total = await _count_parts(session, dialect, filters)
+    windowed = filters.include_total and total is None
+
+    if windowed:
+        stmt = select(*PART_COLUMNS, func.count().over().label("total_count"))
+    else:
+        stmt = select(*PART_COLUMNS)
 
-    # Ordering
-    order_by = getattr(Part, filters.order_by)
+    # Filtering
+    stmt = _apply_filters(stmt, dialect, filters)
+
+    # Ordering, `id` breaks ties so pages are stable. Searches are ranked.
+    order_by = PART_CHANGED_AT if filters.order_by == "updated_at" else Part.__table__.c[filters.order_by]
     sort = asc if filters.sort == "asc" else desc
-    stmt = stmt.order_by(sort(order_by))
+    if filters.q:
+        stmt = apply_search(stmt, dialect, filters.q)
+    elif order_by is Part.__table__.c.id:
+        stmt = stmt.order_by(sort(order_by))
+    else:
+        stmt = stmt.order_by(sort(order_by), sort(Part.id))
 
     # Pagination
-    stmt = stmt.limit(filters.limit).offset(filters.offset)
+    if filters.cursor:
+        value, last_id = decode_cursor(filters.cursor, filters.order_by, filters.sort, order_by)
+        nulls_first = dialect != "postgresql"
+        stmt = stmt.where(keyset_clause(
+            order_by, Part.__table__.c.id, value, last_id,
+            descending=filters.sort == "desc", nulls_first=nulls_first,
+        ))
+        stmt = stmt.limit(filters.limit)
+    else:
+        stmt = stmt.limit(filters.limit).offset(filters.offset)
     
     # Execution
     result = await session.execute(stmt)
-    parts = result.scalars().all()
-    logger.info("Fetched %d parts", len(parts))
-    return parts
+    parts = result.all()
+    if windowed:
+        total = PartTotal(parts[0].total_count) if parts else await _count_parts(session, dialect, filters)
+    logger.debug("Fetched %d parts", len(parts))
+    return parts, total
+
 
+async def list_changes(session: AsyncSession, since: int, limit: int) -> PartChangeBatch:
+    """
+    Returns up to `limit` changes with a sequence number above `since`, in
+    order, along with the current state of the changed parts. A part changed
+    several times appears once, at its latest change.
+    """
+    logger.info("Fetching part changes since %s", since)
+    result = await session.execute(
+        select(PartChange.seq, PartChange.part_id, PartChange.part_number, PartChange.deleted,
+               PartChange.changed_at, *PART_COLUMNS)
+        .outerjoin(Part, Part.id == PartChange.part_id)
+        .where(PartChange.seq > since)
+        .order_by(PartChange.seq)
+        .limit(limit + 1)
+    )
+    rows = result.all()
+    changes = [
+        PartChangeResponse(
+            seq=row[0],
+            part_id=row[1],
+            part_number=row[2],
+            deleted=row[3],
+            changed_at=row[4],
+            part=None if row[3] else serialize_part(row[5:]),
+        )
+        for row in rows[:limit]
+    ]
+    logger.info("Fetched %d part changes", len(changes))
+    return PartChangeBatch(
+        changes=changes,
+        next_since=changes[-1].seq if changes else since,
+        has_more=len(rows) > limit,
+    )
 
-async def create_part(part: PartCreate, session: AsyncSession) -> Part:
+
+async def create_part(part: PartCreate, session: AsyncSession) -> Row:
+    """ Inserts a part with a single INSERT ... RETURNING. """
     logger.info("Creating new part: %s", part.part_number)
-    new_part = Part(**part.model_dump())
-    session.add(new_part)
+    table = Part.__table__
 
     try:
+        result = await session.execute(insert(table).values(**part.model_dump()).returning(*PART_COLUMNS))
+        new_part = result.one()
         await session.commit()
-        await session.refresh(new_part)
     except IntegrityError as e:
         await session.rollback()
         logger.warning("Integrity error while creating part '%s': %s", part.part_number, str(e))
@@ -57,31 +255,136 @@ async def create_part(part: PartCreate, session: AsyncSession) -> Part:
         logger.exception("Unexpected error while creating part '%s': %s", part.part_number, str(e))
         raise PartCreationError("An unexpected error occurred while creating the part")
     
+    await _parts_changed()
+    broker.publish(new_part.id, new_part)
     logger.info("Part created successfully: id=%s part_number=%s",
                 new_part.id, new_part.part_number)
     return new_part
 
 
-async def get_part(part_id: int, session: AsyncSession) -> Part:
-    logger.info("Fetching part with id: %s", part_id)
-    part = await session.get(Part, part_id)
-    if not part:
+async def _parts_by(session: AsyncSession, column, keys: list) -> dict:
+    """ Maps each key found in `column` to a row of `PART_COLUMNS`, with one IN query per chunk. """
+    found = {}
+    unique_keys = list(dict.fromkeys(keys))
+    for start in range(0, len(unique_keys), LOOKUP_CHUNK_SIZE):
+        chunk = unique_keys[start:start + LOOKUP_CHUNK_SIZE]
+        result = await session.execute(select(*PART_COLUMNS).where(column.in_(chunk)))
+        for row in result:
+            found[row._mapping[column]] = row
+    return found
+
+
+async def lookup_parts(lookup: PartLookup, session: AsyncSession) -> PartLookupResult:
+    """
+    Resolves ids and exact part numbers. Rows come in request order, ids
+    first, each with `found` and the part.
+    """
+    logger.info("Looking up %d ids and %d part numbers", len(lookup.ids), len(lookup.part_numbers))
+    by_id = await _parts_by(session, Part.__table__.c.id, lookup.ids)
+    by_part_number = await _parts_by(session, Part.__table__.c.part_number, lookup.part_numbers)
+
+    rows = [{"id": key, "row": by_id.get(key)} for key in lookup.ids]
+    rows += [{"part_number": key, "row": by_part_number.get(key)} for key in lookup.part_numbers]
+    for row in rows:
+        part = row.pop("row")
+        row["found"] = part is not None
+        row["part"] = None if part is None else part_row_to_dict(part)
+
+    found = sum(row["found"] for row in rows)
+    logger.info("Lookup finished: found=%d not_found=%d", found, len(rows) - found)
+    return PartLookupResult.model_validate({"found": found, "not_found": len(rows) - found, "rows": rows})
+
+
+def _part_version(part) -> str:
+    return f"{part.created_at.isoformat()}|{part.version}"
+
+
+async def _get_part_serialized(part_id: int, session: AsyncSession) -> dict:
+    result = await session.execute(select(*PART_COLUMNS).where(Part.id == part_id))
+    row = result.first()
+    if row is None:
         logger.warning("Part with id '%s' not found", part_id)
         raise PartNotFound(f"Part with id '{part_id}' not found")
-    
-    return part
+    return serialize_part(row)
+
+
+async def get_part_cached(part_id: int, session: AsyncSession) -> dict:
+    """
+    Returns a part serialized like `PartResponse`, through `part_cache`.
+
+    Cached entries are checked against the row's version with a primary key
+    lookup, so writes made by other workers are never served stale.
+    Concurrent calls for the same part share one lookup.
+
+    Reads from a replica use the cache but never fill it, so the cache holds
+    nothing older than the primary and clients reading their own writes from
+    the primary are not served a lagging replica's copy.
+    """
+    return await part_flight.do((part_id, _on_replica(session)), lambda: _get_part_cached(part_id, session))
+
+
+async def _get_part_cached(part_id: int, session: AsyncSession) -> dict:
+    if not part_cache.enabled:
+        return await _get_part_serialized(part_id, session)
+
+    cached = await part_cache.get(part_id)
+    if cached is not None:
+        if not part_cache.validate:
+            part_cache.hits += 1
+            return cached["part"]
+
+        result = await session.execute(
+            select(Part.created_at, Part.version).where(Part.id == part_id)
+        )
+        row = result.first()
+        if row is None:
+            await part_cache.invalidate(part_id)
+            logger.warning("Part with id '%s' not found", part_id)
+            raise PartNotFound(f"Part with id '{part_id}' not found")
+        if _part_version(row) == cached["version"]:
+            part_cache.hits += 1
+            return cached["part"]
+        part_cache.stale += 1
+
+    part_cache.misses += 1
+    data = await _get_part_serialized(part_id, session)
+    if _on_replica(session):
+        return data
+    await part_cache.set(part_id, f"{data['created_at']}|{data['version']}", data)
+    return data
 
 
-async def update_part(part_id: int, part: PartCreate, session: AsyncSession, partial=False) -> Part:
+async def update_part(part_id: int, part: PartCreate, session: AsyncSession, partial=False,
+                      expected_versions: list[tuple[int, datetime]] | None = None) -> Row:
+    """
+    Updates a part with a single UPDATE ... RETURNING. With
+    `expected_versions`, (version, created_at) pairs, the update only
+    applies if the part is still at one of those versions (`If-Match`).
+    """
     logger.info("Updating part with id: %s", part_id)
-    existing_part = await get_part(part_id, session)
-    
-    for key, value in part.model_dump(exclude_unset=partial).items():
-        setattr(existing_part, key, value)
+    table = Part.__table__
+    values = part.model_dump(exclude_unset=partial)
+    if values:
+        stmt = (
+            update(table)
+            .values(**values, version=table.c.version + 1, updated_at=func.now())
+            .returning(*PART_COLUMNS)
+        )
+    else:
+        # An empty PATCH changes nothing, the part keeps its version (and ETag)
+        stmt = select(*PART_COLUMNS)
+    stmt = stmt.where(table.c.id == part_id)
+    if expected_versions is not None:
+        stmt = stmt.where(or_(false(), *(
+            and_(table.c.version == version,
+                 table.c.created_at == bindparam(None, created_at, type_=ComparableDateTime))
+            for version, created_at in expected_versions
+        )))
 
     try:
+        result = await session.execute(stmt)
+        updated_part = result.first()
         await session.commit()
-        await session.refresh(existing_part)
     except IntegrityError as e:
         await session.rollback()
         logger.warning("Integrity error while updating part '%s': %s", part.part_number, str(e))
@@ -90,25 +393,296 @@ async def update_part(part_id: int, part: PartCreate, session: AsyncSession, par
         await session.rollback()
         logger.exception("Unexpected error while updating part '%s': %s", part.part_number, str(e))
         raise PartUpdateError("An unexpected error occurred while updating the part")
-    
-    logger.info("Part updated successfully: id=%s part_number=%s",
-                existing_part.id, existing_part.part_number)
-    return existing_part
 
+    if updated_part is None:
+        # Only a failed If-Match needs a second look to tell the two apart
+        if expected_versions is None or await session.scalar(select(Part.id).where(Part.id == part_id)) is None:
+            logger.warning("Part with id '%s' not found", part_id)
+            raise PartNotFound(f"Part with id '{part_id}' not found")
+        logger.warning("Version mismatch while updating part '%s'", part_id)
+        raise PartVersionMismatch(f"Part with id '{part_id}' has been modified")
+    if not values:
+        return updated_part
+
+    await _parts_changed(part_id)
+    broker.publish(part_id, updated_part)
+    logger.info("Part updated successfully: id=%s part_number=%s",
+                updated_part.id, updated_part.part_number)
+    return updated_part
 
 
 async def delete_part(part_id: int, session: AsyncSession) -> None:
+    """ Deletes a part with a single DELETE ... RETURNING. """
     logger.info("Deleting part with id: %s", part_id)
-    part = await get_part(part_id, session)
-    
+    table = Part.__table__
+
     try:
-        await session.delete(part)
+        result = await session.execute(
+            delete(table).where(table.c.id == part_id).returning(table.c.id, table.c.part_number)
+        )
+        part = result.first()
         await session.commit()
     except Exception as e:
         await session.rollback()
-        logger.exception("Unexpected error while deleting part '%s': %s", part.part_number, str(e))
+        logger.exception("Unexpected error while deleting part '%s': %s", part_id, str(e))
         raise PartDeletionError("An unexpected error occurred while deleting the part")
+
+    if part is None:
+        logger.warning("Part with id '%s' not found", part_id)
+        raise PartNotFound(f"Part with id '{part_id}' not found")
     
+    await _parts_changed(part_id)
+    broker.publish(part_id)
     logger.info("Part deleted successfully: id=%s part_number=%s",
                 part.id, part.part_number)
 
+
+async def _upsert_chunk(session: AsyncSession, chunk: list[tuple[int, dict]],
+                        on_conflict: str) -> tuple[list[PartBulkRow], list[Row]]:
+    """
+    Writes one chunk of validated `PartCreate` fields with a single
+    executemany, without committing.
+
+    Returns the row outcomes and the written parts as rows of `PART_COLUMNS`.
+    The outcomes are read from what the insert returned, so a part written
+    concurrently by another transaction is reported correctly.
+    """
+    table = Part.__table__
+    upsert = _DIALECT_INSERTS[session.get_bind().dialect.name](table)
+    if on_conflict == "update":
+        stmt = upsert.on_conflict_do_update(
+            index_elements=[table.c.part_number],
+            set_={
+                "description": upsert.excluded.description,
+                "price": upsert.excluded.price,
+                "quantity": upsert.excluded.quantity,
+                "version": table.c.version + 1,
+                "updated_at": func.now(),
+            },
+        )
+    else:
+        # Conflicting rows are skipped and return nothing
+        stmt = upsert.on_conflict_do_nothing(index_elements=[table.c.part_number])
+
+    result = await session.execute(stmt.returning(*PART_COLUMNS), [part for _, part in chunk])
+    written = result.all()
+    # Inserted rows keep the initial version, updated ones were incremented
+    created = {part.part_number for part in written if part.version == 1}
+
+    rows = []
+    for index, part in chunk:
+        part_number = part["part_number"]
+        if part_number in created:
+            rows.append(PartBulkRow(index=index, part_number=part_number, status="created"))
+        elif on_conflict == "update":
+            rows.append(PartBulkRow(index=index, part_number=part_number, status="updated"))
+        else:
+            rows.append(PartBulkRow(index=index, part_number=part_number, status="rejected",
+                                    detail=f"Part with part_number '{part_number}' already exists"))
+    return rows, written
+
+
+async def bulk_upsert_parts(parts: list[dict], session: AsyncSession,
+                            on_conflict: str = "update") -> PartBulkResult:
+    """
+    Inserts `parts`, dicts of validated `PartCreate` fields (see
+    `validate_bulk_parts`), in chunks of `BULK_CHUNK_SIZE`, one transaction
+    per chunk.
+
+    Existing part numbers are updated (`on_conflict="update"`) or rejected
+    (`on_conflict="reject"`). A failing chunk is rolled back and all of its
+    rows are reported as rejected; the other chunks are kept.
+    """
+    logger.info("Bulk writing %d parts (on_conflict=%s)", len(parts), on_conflict)
+    rows = []
+    pending = []
+    seen = set()
+    for index, part in enumerate(parts):
+        if part["part_number"] in seen:
+            rows.append(PartBulkRow(index=index, part_number=part["part_number"], status="rejected",
+                                    detail="Duplicate part_number in request"))
+            continue
+        seen.add(part["part_number"])
+        pending.append((index, part))
+
+    for start in range(0, len(pending), BULK_CHUNK_SIZE):
+        chunk = pending[start:start + BULK_CHUNK_SIZE]
+        try:
+            chunk_rows, written = await _upsert_chunk(session, chunk, on_conflict)
+            await session.commit()
+            await _parts_changed(*(part.id for part in written))
+            for part in written:
+                broker.publish(part.id, part)
+        except Exception as e:
+            await session.rollback()
+            logger.exception("Unexpected error while bulk writing parts %d-%d: %s",
+                             chunk[0][0], chunk[-1][0], str(e))
+            chunk_rows = [
+                PartBulkRow(index=index, part_number=part["part_number"], status="rejected",
+                            detail="An unexpected error occurred while writing the part")
+                for index, part in chunk
+            ]
+        rows.extend(chunk_rows)
+
+    rows.sort(key=lambda row: row.index)
+    counts = Counter(row.status for row in rows)
+    result = PartBulkResult(
+        created=counts["created"],
+        updated=counts["updated"],
+        rejected=counts["rejected"],
+        rows=rows,
+    )
+
+    logger.info("Bulk write finished: created=%d updated=%d rejected=%d",
+                result.created, result.updated, result.rejected)
+    return result
+
+
+def _stock_update(part_ids: list[int], delta):
+    """
+    Single statement adding `delta` to the quantity of `part_ids`, skipping
+    rows whose quantity would become negative. Row locks are only held while
+    the statement runs.
+    """
+    table = Part.__table__
+    return (
+        update(table)
+        .where(table.c.id.in_(part_ids), table.c.quantity + delta >= 0)
+        .values(quantity=table.c.quantity + delta, version=table.c.version + 1, updated_at=func.now())
+        .returning(*PART_COLUMNS)
+    )
+
+
+async def adjust_stock(part_id: int, delta: int, session: AsyncSession):
+    logger.info("Adjusting stock of part %s by %s", part_id, delta)
+    try:
+        result = await session.execute(_stock_update([part_id], delta))
+        part = result.first()
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.exception("Unexpected error while adjusting stock of part '%s': %s", part_id, str(e))
+        raise PartUpdateError("An unexpected error occurred while adjusting the stock")
+
+    if part is None:
+        if await session.scalar(select(Part.id).where(Part.id == part_id)) is None:
+            logger.warning("Part with id '%s' not found", part_id)
+            raise PartNotFound(f"Part with id '{part_id}' not found")
+        logger.warning("Insufficient stock for part '%s' (delta=%s)", part_id, delta)
+        raise InsufficientStock(f"Insufficient stock for part with id '{part_id}'")
+
+    await _parts_changed(part_id)
+    broker.publish(part_id, part)
+    logger.info("Stock adjusted: id=%s quantity=%s", part.id, part.quantity)
+    return part
+
+
+async def adjust_stock_batch(adjustments: list[StockAdjustmentItem], session: AsyncSession) -> StockBatchResult:
+    """
+    Applies all adjustments with one UPDATE. Deltas for the same part are
+    summed; adjustments that would make stock negative are rejected while the
+    others are applied.
+    """
+    logger.info("Adjusting stock of %d parts", len(adjustments))
+    deltas: dict[int, int] = {}
+    for adjustment in adjustments:
+        deltas[adjustment.part_id] = deltas.get(adjustment.part_id, 0) + adjustment.delta
+    if not deltas:
+        return StockBatchResult()
+
+    delta = case(deltas, value=Part.__table__.c.id)
+    try:
+        result = await session.execute(_stock_update(list(deltas), delta))
+        applied = {part.id: part for part in result.all()}
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.exception("Unexpected error while adjusting stock: %s", str(e))
+        raise PartUpdateError("An unexpected error occurred while adjusting the stock")
+
+    missing = [part_id for part_id in deltas if part_id not in applied]
+    existing = set()
+    if missing:
+        existing = set((await session.execute(select(Part.id).where(Part.id.in_(missing)))).scalars())
+    await _parts_changed(*applied)
+    for part_id, part in applied.items():
+        broker.publish(part_id, part)
+
+    rejected = [
+        StockRejection(part_id=part_id, detail=(
+            f"Insufficient stock for part with id '{part_id}'" if part_id in existing
+            else f"Part with id '{part_id}' not found"
+        ))
+        for part_id in missing
+    ]
+    logger.info("Stock adjusted: applied=%d rejected=%d", len(applied), len(rejected))
+    return StockBatchResult(
+        applied=[PartResponse.model_validate(applied[part_id]) for part_id in deltas if part_id in applied],
+        rejected=rejected,
+    )
+
+
+async def get_part_stats(session: AsyncSession, low_stock_threshold: int) -> PartStats:
+    """
+    Inventory totals and a quantity histogram, aggregated by the database in
+    a single scan. Results are cached until the next write.
+
+    Cached results are checked against the latest change feed sequence
+    number, a single index lookup, so writes made by other workers are
+    never served stale.
+    """
+    key = str(low_stock_threshold)
+    generation = part_cache.stats_generation
+    seq = None
+    if part_cache.enabled and part_cache.validate:
+        seq = await session.scalar(select(func.max(PartChange.seq)))
+    cached = await part_cache.get_stats(key, seq)
+    if cached is not None:
+        return PartStats.model_validate(cached)
+
+    # Inclusive (min, max) per bucket, the last one is open ended
+    bounds = [
+        (low, None if high is None else high - 1)
+        for low, high in zip(QUANTITY_HISTOGRAM_BOUNDS, QUANTITY_HISTOGRAM_BOUNDS[1:] + (None,))
+    ]
+    buckets = [
+        func.count().filter(Part.quantity >= low if high is None else Part.quantity.between(low, high))
+        for low, high in bounds
+    ]
+    result = await session.execute(select(
+        func.count(),
+        func.coalesce(func.sum(Part.quantity), 0),
+        func.coalesce(func.sum(Part.price * Part.quantity), 0),
+        func.count().filter(Part.quantity == 0),
+        func.count().filter(Part.quantity.between(1, low_stock_threshold - 1)),
+        *buckets,
+    ))
+    parts, total_quantity, inventory_value, out_of_stock, low_stock, *counts = result.one()
+
+    stats = PartStats(
+        parts=parts,
+        total_quantity=total_quantity,
+        inventory_value=inventory_value,
+        out_of_stock=out_of_stock,
+        low_stock=low_stock,
+        low_stock_threshold=low_stock_threshold,
+        quantity_histogram=[
+            QuantityBucket(min=low, max=high, count=count) for (low, high), count in zip(bounds, counts)
+        ],
+    )
+    await part_cache.set_stats(key, stats.model_dump(), generation, seq)
+    return stats
+
+
+async def warm_up(session: AsyncSession) -> None:
+    """
+    Runs the read statements of the hottest routes once, so SQLAlchemy has
+    them compiled and cached before the first request. The lookups match no
+    row (ids start at 1). Nothing is written: a worker starting up must not
+    need the write lock or write access to the database.
+    """
+    await session.execute(select(*PART_COLUMNS).where(Part.id == 0))
+    await session.execute(select(Part.created_at, Part.version).where(Part.id == 0))
+    await session.execute(select(Part.id).where(Part.id == 0))
+    await _list_parts(session, PartFilters(limit=1))
+    await session.rollback()
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Callable, Hashable
+from typing import TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+# Longest a request waits for someone else's query before running its own
+SINGLE_FLIGHT_MAX_HOLD = float(os.getenv("SINGLE_FLIGHT_MAX_HOLD_MS", "1000")) / 1000
+
+
+class _LeaderGone(Exception):
+    """ The request running the shared call was cancelled. """
+
+
+class SingleFlight:
+    """
+    Lets concurrent calls with the same key share one execution.
+
+    The first caller for a key runs the call; callers arriving while it is in
+    flight wait for its result (or exception) instead of running it again.
+    They wait at most `max_hold` seconds, then run the call themselves.
+    """
+
+    def __init__(self, max_hold: float = SINGLE_FLIGHT_MAX_HOLD, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.max_hold = max_hold
+        self.enabled = enabled
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.shared = 0
+        self.timeouts = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        if not self.enabled:
+            return await call()
+
+        future = self._calls.get(key)
+        if future is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), self.max_hold)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return await call()
+            except _LeaderGone:
+                return await call()
+            except Exception:
+                self.shared += 1
+                raise
+            self.shared += 1
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await call()
+        except BaseException as e:
+            future.set_exception(e if isinstance(e, Exception) else _LeaderGone())
+            # Marks the exception as retrieved, nobody may be waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def forget(self, key: Hashable | None = None) -> None:
+        """
+        Makes later callers start a new call instead of joining the one in
+        flight for `key` (for every key when None). Used after writes, so a
+        client never gets a result read before its own write.
+        """
+        if key is None:
+            self._calls.clear()
+        else:
+            self._calls.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "shared": self.shared,
+            "timeouts": self.timeouts,
+        }
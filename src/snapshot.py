@@ -0,0 +1,267 @@
+"""
+Packed columnar snapshot of the catalog: id, part number, price and quantity
+of every part, in a file that batch jobs memory-map and scan without creating
+an object per part.
+
+Layout (little-endian, every section starts at a multiple of 8 bytes):
+
+    header     magic b"PVSNAP\\0\\0", u32 format version (1), u32 reserved,
+               u64 count, u64 seq, u64 size of the string buffer
+    ids        int64[count], ascending
+    quantities int64[count]
+    prices     float64[count]
+    offsets    int64[count + 1], part number i is strings[offsets[i]:offsets[i + 1]]
+    strings    the UTF-8 part numbers, back to back
+
+`seq` is the `part_changes` sequence number the snapshot is current with.
+Refreshing reads only the changes after it and merges them into a new file,
+which replaces the old one atomically; readers that still map the old file
+keep a consistent view.
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections.abc import Iterator
+from typing import BinaryIO
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from .models import Part, PartChange
+
+
+logger = logging.getLogger(__name__)
+
+# Where `GET /parts/snapshot` keeps the snapshot of this host
+SNAPSHOT_PATH = os.getenv("PART_SNAPSHOT_PATH", "./parts.snapshot")
+# Rows fetched per round trip while building or merging
+SNAPSHOT_BATCH_SIZE = 10_000
+# With more pending changes than this share of the parts, rebuild from scratch
+SNAPSHOT_REBUILD_RATIO = 0.5
+
+MAGIC = b"PVSNAP\0\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")
+
+MEDIA_TYPE = "application/vnd.partventory.snapshot"
+
+
+class SnapshotColumns:
+    """ Columns being collected for a new snapshot, in id order. """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.quantities = array("q")
+        self.prices = array("d")
+        self.offsets = array("q", [0])
+        self.strings = bytearray()
+
+    def append(self, part_id: int, part_number: bytes, price: float, quantity: int) -> None:
+        self.ids.append(part_id)
+        self.quantities.append(quantity)
+        self.prices.append(price)
+        self.strings += part_number
+        self.offsets.append(len(self.strings))
+
+    def write(self, path: str, seq: int) -> None:
+        """ Writes the snapshot next to `path`, then moves it over `path`. """
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(self.ids), seq, len(self.strings)))
+            for column in (self.ids, self.quantities, self.prices, self.offsets):
+                column.tofile(f)
+            f.write(self.strings)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class PartSnapshot:
+    """
+    A memory-mapped snapshot. The columns are memoryviews over the mapping,
+    so the file is paged in as it is read and nothing is copied.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, self.seq, strings_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} part snapshot")
+
+        self._view = view = memoryview(self._mmap)
+        start = HEADER.size
+        columns = []
+        for typecode, length in (("q", self.count), ("q", self.count), ("d", self.count), ("q", self.count + 1)):
+            end = start + 8 * length
+            columns.append(view[start:end].cast(typecode))
+            start = end
+        self.ids, self.quantities, self.prices, self.offsets = columns
+        self.strings = view[start:start + strings_size]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self) -> "PartSnapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for column in (self.ids, self.quantities, self.prices, self.offsets, self.strings, self._view):
+            column.release()
+        self._mmap.close()
+
+    def part_number_bytes(self, index: int) -> bytes:
+        return self.strings[self.offsets[index]:self.offsets[index + 1]].tobytes()
+
+    def part_number(self, index: int) -> str:
+        return self.part_number_bytes(index).decode()
+
+    def find(self, part_id: int) -> int | None:
+        """ Index of the part with `part_id`, by binary search over the ids. """
+        index = bisect_left(self.ids, part_id)
+        if index < self.count and self.ids[index] == part_id:
+            return index
+        return None
+
+    def rows(self) -> Iterator[tuple[int, str, float, int]]:
+        """ (id, part_number, price, quantity) per part, created as iterated. """
+        for index in range(self.count):
+            yield self.ids[index], self.part_number(index), self.prices[index], self.quantities[index]
+
+
+def open_snapshot(path: str = SNAPSHOT_PATH) -> PartSnapshot | None:
+    """ The snapshot at `path`, or None when there is none (or it is unreadable). """
+    try:
+        return PartSnapshot(path)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning("Ignoring snapshot: %s", str(e))
+        return None
+
+
+def read_snapshot_file(path: str = SNAPSHOT_PATH) -> tuple[BinaryIO, int, int]:
+    """
+    Opens the snapshot for sending. Returns the open file, its size and its
+    sequence number; the file stays readable when a refresh replaces it.
+    """
+    f = open(path, "rb")
+    header = f.read(HEADER.size)
+    f.seek(0)
+    return f, os.fstat(f.fileno()).st_size, HEADER.unpack(header)[4]
+
+
+def iter_file(f: BinaryIO, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    with f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def _merge(snapshot: PartSnapshot, changed: dict[int, tuple[bytes, float, int] | None]) -> SnapshotColumns:
+    """ The snapshot's rows with `changed` applied (None deletes the part). """
+    columns = SnapshotColumns()
+    changed_ids = sorted(changed)
+    next_change = 0
+    for index in range(snapshot.count):
+        part_id = snapshot.ids[index]
+        while next_change < len(changed_ids) and changed_ids[next_change] < part_id:
+            new_id = changed_ids[next_change]
+            if changed[new_id] is not None:
+                columns.append(new_id, *changed[new_id])
+            next_change += 1
+        if next_change < len(changed_ids) and changed_ids[next_change] == part_id:
+            if changed[part_id] is not None:
+                columns.append(part_id, *changed[part_id])
+            next_change += 1
+        else:
+            columns.append(part_id, snapshot.part_number_bytes(index), snapshot.prices[index],
+                           snapshot.quantities[index])
+    for new_id in changed_ids[next_change:]:
+        if changed[new_id] is not None:
+            columns.append(new_id, *changed[new_id])
+    return columns
+
+
+async def _build(session_factory: sessionmaker, path: str) -> tuple[int, int]:
+    async with session_factory() as session:
+        # Read first: changes committed during the scan have a later seq and
+        # are merged again by the next refresh
+        seq = await session.scalar(select(func.coalesce(func.max(PartChange.seq), 0)))
+        stmt = (
+            select(Part.id, Part.part_number, Part.price, Part.quantity)
+            .order_by(Part.id)
+            .execution_options(yield_per=SNAPSHOT_BATCH_SIZE)
+        )
+        columns = SnapshotColumns()
+        result = await session.stream(stmt)
+        async for rows in result.partitions():
+            for part_id, part_number, price, quantity in rows:
+                columns.append(part_id, part_number.encode(), float(price), quantity)
+    await asyncio.to_thread(columns.write, path, seq)
+    return len(columns.ids), seq
+
+
+async def _refresh(session_factory: sessionmaker, snapshot: PartSnapshot, path: str) -> tuple[int, int] | None:
+    """ Merges the changes since the snapshot, None when a rebuild is cheaper. """
+    async with session_factory() as session:
+        pending = await session.scalar(select(func.count()).where(PartChange.seq > snapshot.seq))
+        if not pending:
+            return snapshot.count, snapshot.seq
+        if pending > max(SNAPSHOT_BATCH_SIZE, snapshot.count * SNAPSHOT_REBUILD_RATIO):
+            return None
+
+        changed: dict[int, tuple[bytes, float, int] | None] = {}
+        seq = snapshot.seq
+        stmt = (
+            select(PartChange.seq, PartChange.part_id, PartChange.deleted, Part.part_number, Part.price, Part.quantity)
+            .outerjoin(Part, Part.id == PartChange.part_id)
+            .where(PartChange.seq > snapshot.seq)
+            .order_by(PartChange.seq)
+            .execution_options(yield_per=SNAPSHOT_BATCH_SIZE)
+        )
+        result = await session.stream(stmt)
+        async for rows in result.partitions():
+            for row_seq, part_id, deleted, part_number, price, quantity in rows:
+                # A part deleted after its change was recorded has no row
+                changed[part_id] = None if deleted or part_number is None else (
+                    part_number.encode(), float(price), quantity
+                )
+                seq = row_seq
+
+    def merge_and_write() -> int:
+        columns = _merge(snapshot, changed)
+        columns.write(path, seq)
+        return len(columns.ids)
+
+    return await asyncio.to_thread(merge_and_write), seq
+
+
+_refresh_lock = asyncio.Lock()
+
+
+async def refresh_snapshot(session_factory: sessionmaker, path: str = SNAPSHOT_PATH) -> tuple[int, int]:
+    """
+    Brings the snapshot at `path` up to date, building it when there is none.
+    Returns its part count and sequence number.
+    """
+    async with _refresh_lock:
+        snapshot = open_snapshot(path)
+        refreshed = None
+        if snapshot is not None:
+            with snapshot:
+                refreshed = await _refresh(session_factory, snapshot, path)
+            if refreshed is not None and refreshed[1] != snapshot.seq:
+                logger.info("Snapshot merged up to seq %d, %d parts", refreshed[1], refreshed[0])
+        if refreshed is None:
+            refreshed = await _build(session_factory, path)
+            logger.info("Snapshot built at seq %d, %d parts", refreshed[1], refreshed[0])
+        return refreshed
@@ -1,14 +1,23 @@
+import atexit
+import shutil
+import tempfile
+
 import pytest_asyncio
 from httpx import AsyncClient
 from httpx._transports.asgi import ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+from src.cache import part_cache
 from src.main import app
-from src.database import Base, get_session
+from src.database import Base, get_session, get_sessionmaker
+
 
+# Scratch databases live outside the tree and are removed after the run
+TEST_DIR = tempfile.mkdtemp(prefix="partventory-tests-")
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
 
-TEST_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
+TEST_DATABASE_URL = f"sqlite+aiosqlite:///{TEST_DIR}/test.db"
 
 test_engine = create_async_engine(
     TEST_DATABASE_URL,
@@ -26,6 +35,7 @@ async def setup_database():
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    await part_cache.clear()
 
 
 async def override_get_session():
@@ -34,6 +44,7 @@ async def override_get_session():
 
 
 app.dependency_overrides[get_session] = override_get_session
+app.dependency_overrides[get_sessionmaker] = lambda: TestSessionLocal
 
 
 @pytest_asyncio.fixture
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.admission import Priority, Watchdog, watchdog
+from src.database import PoolStats, TimedQueuePool, pool_stats
+from src.instrumentation import LoopLagMonitor, loop_lag
+from tests.conftest import TEST_DATABASE_URL
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_time_waiting_checkouts():
+    engine = create_async_engine(TEST_DATABASE_URL, poolclass=TimedQueuePool, pool_size=1, max_overflow=0)
+    engine.pool.stats = PoolStats()
+    stats = pool_stats(engine)
+    try:
+        async with engine.connect():
+            waiter = asyncio.create_task(engine.connect().start())
+            await asyncio.sleep(0.05)
+            assert stats.waiting == 1
+            assert stats.wait >= 0.04
+        connection = await waiter
+        await connection.close()
+        assert stats.waiting == 0
+        assert stats.checkouts == 2
+        assert stats.max_wait >= 0.04
+
+        # Survives the pool being replaced
+        await engine.dispose()
+        assert pool_stats(engine) is stats
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_slow_connects_are_not_pool_waits():
+    engine = create_async_engine(TEST_DATABASE_URL, poolclass=TimedQueuePool, pool_size=1, max_overflow=0)
+    engine.pool.stats = PoolStats()
+    event.listen(engine.sync_engine, "connect", lambda dbapi_connection, record: time.sleep(0.15))
+    try:
+        async with engine.connect():
+            pass
+        stats = pool_stats(engine)
+        assert stats.wait < 0.1
+        assert Watchdog(LoopLagMonitor(), stats, max_pool_wait=0.1).admit(Priority.LOW)
+    finally:
+        await engine.dispose()
+
+
+def test_pool_stats_forget_old_waits():
+    stats = PoolStats(window=0.0)
+    stats.leave(stats.enter())
+    assert stats.checkouts == 1
+    assert stats.wait == 0.0
+
+
+def test_watchdog_sheds_by_priority():
+    lag = LoopLagMonitor()
+    pool = PoolStats()
+    dog = Watchdog(lag, pool, max_loop_lag=0.1, max_pool_wait=0.1, max_pool_waiting=2, normal_factor=5)
+    assert all(dog.admit(priority) for priority in Priority)
+
+    lag.last = 0.2
+    assert not dog.admit(Priority.LOW)
+    assert dog.admit(Priority.NORMAL)
+    assert dog.admit(Priority.CRITICAL)
+
+    lag.last = 0.0
+    for _ in range(11):
+        pool.enter()
+    assert not dog.admit(Priority.NORMAL)
+    assert dog.admit(Priority.CRITICAL)
+    assert dog.stats()["low_shed"] == 1
+    assert dog.stats()["normal_shed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_overloaded_requests_get_503(client: AsyncClient, monkeypatch):
+    response = await client.post("/parts", json={"part_number": "ADM-1", "price": 1.0, "quantity": 5})
+    part_id = response.json()["id"]
+
+    monkeypatch.setattr(loop_lag, "last", watchdog.max_loop_lag * 2)
+
+    response = await client.get("/parts")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    assert (await client.get(f"/parts/{part_id}")).status_code == 200
+    response = await client.post(f"/parts/{part_id}/stock", json={"delta": -2})
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 3
@@ -1,7 +1,17 @@
+import csv
+import io
+import json
+from datetime import datetime
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import event, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.models import Part
+from src.schemas import StockAdjustmentItem
+from src.serialization import PART_FIELDS
+from src.service import adjust_stock, adjust_stock_batch, warm_up
+from tests.conftest import test_engine
 
 valid_part_payload = {
     "part_number": "TEST-PART-001",
@@ -231,3 +241,645 @@ async def test_delete_part_success(client: AsyncClient):
     assert response.status_code == 404
     assert response.json()["detail"] == f"Part with id '{part_id}' not found"
 
+
+@pytest.mark.asyncio
+async def test_delete_part_not_found(client: AsyncClient):
+    response = await client.delete("/parts/999999")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Part with id '999999' not found"
+
+
+@pytest.mark.asyncio
+async def test_writes_are_single_statements(client: AsyncClient):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0])
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+        await client.put(f"/parts/{part_id}", json={**valid_part_payload, "quantity": 1})
+        await client.patch(f"/parts/{part_id}", json={"quantity": 2})
+        await client.delete(f"/parts/{part_id}")
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", capture)
+    assert statements == ["INSERT", "UPDATE", "UPDATE", "DELETE"]
+
+
+
+async def walk_cursor(client: AsyncClient, params: dict) -> list[dict]:
+    parts = []
+    cursor = None
+    while True:
+        page_params = dict(params)
+        if cursor:
+            page_params["cursor"] = cursor
+        response = await client.get("/parts", params=page_params)
+        assert response.status_code == 200
+        parts.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return parts
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("order_by", ["id", "price", "quantity", "created_at", "updated_at"])
+@pytest.mark.parametrize("sort", ["asc", "desc"])
+async def test_list_parts_cursor_walks_every_part_once(client: AsyncClient, order_by: str, sort: str):
+    for idx in range(7):
+        await part_factory(client, idx)
+    await client.patch("/parts/3", json={"description": "touched"})
+
+    parts = await walk_cursor(client, {"limit": 2, "order_by": order_by, "sort": sort})
+    ids = [part["id"] for part in parts]
+    assert sorted(ids) == list(range(1, 8))
+
+    response = await client.get("/parts", params={"limit": 100, "order_by": order_by, "sort": sort})
+    assert ids == [part["id"] for part in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_list_parts_cursor_with_filter(client: AsyncClient):
+    for idx in range(5):
+        await part_factory(client, idx)
+
+    parts = await walk_cursor(client, {"limit": 1, "description": "Test part", "order_by": "price"})
+    assert len(parts) == 5
+
+
+@pytest.mark.asyncio
+async def test_list_parts_invalid_cursor(client: AsyncClient):
+    response = await client.get("/parts", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.asyncio
+async def test_list_parts_cursor_ordering_mismatch(client: AsyncClient):
+    for idx in range(3):
+        await part_factory(client, idx)
+
+    response = await client.get("/parts", params={"limit": 1, "order_by": "price"})
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = await client.get("/parts", params={"limit": 1, "order_by": "quantity", "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor does not match the requested ordering"
+
+
+@pytest.mark.asyncio
+async def test_list_parts_cursor_with_offset(client: AsyncClient):
+    response = await client.get("/parts", params={"offset": 10, "cursor": "abc"})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_list_parts_search(client: AsyncClient):
+    for idx in range(3):
+        await part_factory(client, idx)
+    await client.post("/parts", json={
+        "part_number": "BRK-1001",
+        "description": "Front brake assembly",
+        "price": 50.0,
+        "quantity": 3,
+    })
+
+    response = await client.get("/parts", params={"q": "brake"})
+    assert response.status_code == 200
+    assert [part["part_number"] for part in response.json()] == ["BRK-1001"]
+
+    response = await client.get("/parts", params={"q": "test part"})
+    assert len(response.json()) == 3
+
+    response = await client.get("/parts", params={"q": "br"})
+    assert [part["part_number"] for part in response.json()] == ["BRK-1001"]
+
+
+@pytest.mark.asyncio
+async def test_list_parts_search_follows_updates_and_deletes(client: AsyncClient):
+    response = await client.post("/parts", json=valid_part_payload)
+    part_id = response.json()["id"]
+
+    await client.patch(f"/parts/{part_id}", json={"description": "Hydraulic pump"})
+    response = await client.get("/parts", params={"q": "pump"})
+    assert [part["id"] for part in response.json()] == [part_id]
+    response = await client.get("/parts", params={"description": "test"})
+    assert response.json() == []
+
+    await client.delete(f"/parts/{part_id}")
+    response = await client.get("/parts", params={"q": "pump"})
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_list_parts_part_number_prefix(client: AsyncClient):
+    for idx in range(3):
+        await part_factory(client, idx)
+    await client.post("/parts", json={**valid_part_payload, "part_number": "OTHER-TEST-PART-001"})
+
+    response = await client.get("/parts", params={"part_number_prefix": "TEST-PART"})
+    assert len(response.json()) == 3
+
+    response = await client.get("/parts", params={"part_number": "TEST-PART"})
+    assert len(response.json()) == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("prefix", ["\U0010ffff", "A\U0010ffff", "A\ud7ff"])
+async def test_list_parts_prefix_of_last_characters(client: AsyncClient, prefix):
+    await client.post("/parts", json={**valid_part_payload, "part_number": f"{prefix}-001"})
+    await client.post("/parts", json={**valid_part_payload, "part_number": "B-001"})
+
+    response = await client.get("/parts", params={"part_number_prefix": prefix})
+    assert response.status_code == 200
+    assert [part["part_number"] for part in response.json()] == [f"{prefix}-001"]
+
+
+@pytest.mark.asyncio
+async def test_list_parts_range_filters(client: AsyncClient):
+    for idx in range(5):
+        await part_factory(client, idx)
+
+    response = await client.get("/parts", params={"quantity_gt": 10, "quantity_lt": 14})
+    assert [part["quantity"] for part in response.json()] == [11, 12, 13]
+
+    response = await client.get("/parts", params={"price_min": 101, "price_max": 102.5, "order_by": "price"})
+    assert [part["price"] for part in response.json()] == [101.0, 102.0]
+
+    response = await client.get("/parts", params={"updated_since": "2000-01-01T00:00:00Z"})
+    assert len(response.json()) == 5
+
+    response = await client.get("/parts", params={"updated_since": "2999-01-01T00:00:00+02:00"})
+    assert response.json() == []
+
+    response = await client.get("/parts", params={"quantity_lt": -1})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("params, index", [
+    ({"price_min": 101, "price_max": 103, "order_by": "price"}, "ix_parts_price_id (price>? AND price<?)"),
+    ({"quantity_lt": 12, "order_by": "quantity", "sort": "desc"}, "ix_parts_quantity_id (quantity<?)"),
+    ({"order_by": "created_at"}, "ix_parts_created_at_id"),
+    ({"order_by": "updated_at", "sort": "desc"}, "ix_parts_changed_at_id"),
+    ({"updated_since": "2000-01-01T00:00:00Z", "order_by": "updated_at"}, "ix_parts_changed_at_id (<expr>>?)"),
+])
+async def test_list_parts_range_filters_use_indexes(client: AsyncClient, session: AsyncSession, params, index):
+    for idx in range(5):
+        await part_factory(client, idx)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT parts.part_number"):
+            statements.append((statement, parameters))
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        response = await client.get("/parts", params=params)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", capture)
+    assert response.status_code == 200
+
+    statement, parameters = statements[-1]
+    conn = await session.connection()
+    plan = [row[3] for row in await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+    assert any(index in step for step in plan), plan
+    # Rows come out of the index in order, no sort step
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+@pytest.mark.asyncio
+async def test_list_parts_include_total(client: AsyncClient):
+    for idx in range(5):
+        await part_factory(client, idx)
+
+    response = await client.get("/parts", params={"limit": 2, "include_total": True})
+    assert len(response.json()) == 2
+    assert response.headers["X-Total-Count"] == "5"
+    assert "X-Total-Count-Estimated" not in response.headers
+
+    response = await client.get("/parts", params={"quantity": 12, "include_total": True})
+    assert response.headers["X-Total-Count"] == "1"
+
+    response = await client.get("/parts", params={"offset": 10, "include_total": True})
+    assert response.json() == []
+    assert response.headers["X-Total-Count"] == "5"
+
+    response = await client.get("/parts", params={"limit": 2, "include_total": True, "order_by": "price"})
+    response = await client.get("/parts", params={
+        "limit": 2, "include_total": True, "order_by": "price", "cursor": response.headers["X-Next-Cursor"]})
+    assert [part["part_number"] for part in response.json()] == ["TEST-PART-003", "TEST-PART-004"]
+    assert response.headers["X-Total-Count"] == "5"
+
+    response = await client.get("/parts")
+    assert "X-Total-Count" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_list_parts_total_estimate(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr("src.service.COUNT_ESTIMATE_THRESHOLD", 3)
+    for idx in range(5):
+        await part_factory(client, idx)
+
+    response = await client.get("/parts", params={"limit": 2, "include_total": True})
+    assert response.headers["X-Total-Count"] == "5"
+    assert response.headers["X-Total-Count-Estimated"] == "true"
+
+    # Filtered totals are always exact
+    response = await client.get("/parts", params={"part_number_prefix": "TEST", "include_total": True})
+    assert response.headers["X-Total-Count"] == "5"
+    assert "X-Total-Count-Estimated" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_list_changes(client: AsyncClient):
+    for idx in range(3):
+        await part_factory(client, idx)
+    ids = [part["id"] for part in (await client.get("/parts")).json()]
+
+    response = await client.get("/parts/changes", params={"limit": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert [change["part_id"] for change in data["changes"]] == ids[:2]
+    assert data["has_more"] is True
+    assert data["changes"][0]["part"]["part_number"] == "TEST-PART-001"
+
+    response = await client.get("/parts/changes", params={"since": data["next_since"]})
+    data = response.json()
+    assert [change["part_id"] for change in data["changes"]] == ids[2:]
+    assert data["has_more"] is False
+    since = data["next_since"]
+
+    response = await client.get("/parts/changes", params={"since": since})
+    assert response.json() == {"changes": [], "next_since": since, "has_more": False}
+
+    await client.patch(f"/parts/{ids[0]}", json={"quantity": 1})
+    await client.post("/parts/stock", json=[{"part_id": ids[0], "delta": 1}])
+    await client.delete(f"/parts/{ids[1]}")
+    await client.post("/parts/bulk", json=[{**valid_part_payload, "part_number": "TEST-PART-003", "quantity": 7}])
+
+    response = await client.get("/parts/changes", params={"since": since})
+    changes = response.json()["changes"]
+    # One entry per part, at its latest change
+    assert [(change["part_id"], change["deleted"]) for change in changes] == [
+        (ids[0], False), (ids[1], True), (ids[2], False),
+    ]
+    assert changes[0]["part"]["quantity"] == 2
+    assert changes[1]["part"] is None
+    assert changes[1]["part_number"] == "TEST-PART-002"
+    assert changes[2]["part"]["quantity"] == 7
+
+
+@pytest.mark.asyncio
+async def test_part_stats(client: AsyncClient):
+    for quantity, price in [(0, 10.0), (3, 2.5), (15, 1.0), (150, 0.5), (2000, 0.01)]:
+        await client.post("/parts", json={
+            **valid_part_payload, "part_number": f"STATS-{quantity}", "quantity": quantity, "price": price})
+
+    response = await client.get("/parts/stats", params={"low_stock_threshold": 20})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["parts"] == 5
+    assert data["total_quantity"] == 2168
+    assert data["inventory_value"] == pytest.approx(7.5 + 15 + 75 + 20)
+    assert (data["out_of_stock"], data["low_stock"], data["low_stock_threshold"]) == (1, 2, 20)
+    assert data["quantity_histogram"] == [
+        {"min": 0, "max": 0, "count": 1},
+        {"min": 1, "max": 9, "count": 1},
+        {"min": 10, "max": 99, "count": 1},
+        {"min": 100, "max": 999, "count": 1},
+        {"min": 1000, "max": None, "count": 1},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_part_stats_follow_writes(client: AsyncClient):
+    response = await client.get("/parts/stats")
+    assert response.json()["parts"] == 0
+
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+    response = await client.get("/parts/stats")
+    assert response.json()["total_quantity"] == valid_part_payload["quantity"]
+
+    await client.post(f"/parts/{part_id}/stock", json={"delta": 5})
+    response = await client.get("/parts/stats")
+    assert response.json()["total_quantity"] == valid_part_payload["quantity"] + 5
+
+    await client.delete(f"/parts/{part_id}")
+    response = await client.get("/parts/stats")
+    assert response.json()["parts"] == 0
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_parts(client: AsyncClient):
+    await client.post("/parts", json=valid_part_payload)
+    payload = [
+        {**valid_part_payload, "quantity": 99},
+        {**valid_part_payload, "part_number": "BULK-001"},
+        {**valid_part_payload, "part_number": "BULK-002"},
+        {**valid_part_payload, "part_number": "BULK-001"},
+    ]
+
+    response = await client.post("/parts/bulk", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["updated"], data["rejected"]) == (2, 1, 1)
+    assert [row["status"] for row in data["rows"]] == ["updated", "created", "created", "rejected"]
+    assert data["rows"][3]["detail"] == "Duplicate part_number in request"
+
+    response = await client.get("/parts", params={"part_number": valid_part_payload["part_number"]})
+    assert response.json()[0]["quantity"] == 99
+    assert response.json()[0]["updated_at"] is not None
+
+    response = await client.get("/parts")
+    assert len(response.json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_parts_reject_existing(client: AsyncClient):
+    await client.post("/parts", json=valid_part_payload)
+    payload = [
+        {**valid_part_payload, "quantity": 99},
+        {**valid_part_payload, "part_number": "BULK-001"},
+    ]
+
+    response = await client.post("/parts/bulk", params={"on_conflict": "reject"}, json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert [row["status"] for row in data["rows"]] == ["rejected", "created"]
+    assert data["rows"][0]["detail"] == (
+        f"Part with part_number '{valid_part_payload['part_number']}' already exists"
+    )
+
+    response = await client.get("/parts", params={"part_number": valid_part_payload["part_number"]})
+    assert response.json()[0]["quantity"] == valid_part_payload["quantity"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("on_conflict,status", [("reject", "rejected"), ("update", "updated")])
+async def test_bulk_create_parts_concurrent_insert(client: AsyncClient, on_conflict, status):
+    # Another transaction inserts the part right before the bulk insert runs
+    inserted = []
+
+    def insert_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO parts") and not inserted:
+            inserted.append(statement)
+            cursor.execute("INSERT INTO parts (part_number, price, quantity, version) VALUES ('BULK-001', 1, 1, 1)")
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", insert_first)
+    try:
+        payload = [{**valid_part_payload, "part_number": "BULK-001"}, {**valid_part_payload, "part_number": "BULK-002"}]
+        response = await client.post("/parts/bulk", params={"on_conflict": on_conflict}, json=payload)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", insert_first)
+    assert [row["status"] for row in response.json()["rows"]] == [status, "created"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_parts_in_chunks(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr("src.service.BULK_CHUNK_SIZE", 3)
+    payload = [{**valid_part_payload, "part_number": f"BULK-{idx:03}"} for idx in range(10)]
+
+    response = await client.post("/parts/bulk", json=payload)
+    assert response.json()["created"] == 10
+
+    response = await client.get("/parts", params={"q": "BULK"})
+    assert len(response.json()) == 10
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_parts_invalid_row(client: AsyncClient):
+    payload = [valid_part_payload, {**valid_part_payload, "price": -1}]
+    response = await client.post("/parts/bulk", json=payload)
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_lookup_parts(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr("src.service.LOOKUP_CHUNK_SIZE", 2)
+    for idx in range(5):
+        await part_factory(client, idx)
+    ids = [part["id"] for part in (await client.get("/parts")).json()]
+
+    response = await client.post("/parts/lookup", json={
+        "ids": [ids[4], 999, ids[0], ids[4]],
+        "part_numbers": ["TEST-PART-003", "TEST-PART", "TEST-PART-001"],
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["found"], data["not_found"]) == (5, 2)
+    assert [(row["id"], row["found"]) for row in data["rows"][:4]] == [
+        (ids[4], True), (999, False), (ids[0], True), (ids[4], True),
+    ]
+    assert data["rows"][1]["part"] is None
+    assert data["rows"][2]["part"]["part_number"] == "TEST-PART-001"
+    # Exact matches only
+    assert [(row["part_number"], row["found"]) for row in data["rows"][4:]] == [
+        ("TEST-PART-003", True), ("TEST-PART", False), ("TEST-PART-001", True),
+    ]
+    assert data["rows"][4]["part"]["id"] == ids[2]
+
+
+@pytest.mark.asyncio
+async def test_lookup_parts_limit(client: AsyncClient):
+    response = await client.post("/parts/lookup", json={"ids": list(range(600)), "part_numbers": ["A"] * 401})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_export_parts_ndjson(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr("src.export.EXPORT_BATCH_SIZE", 2)
+    for idx in range(5):
+        await part_factory(client, idx)
+
+    response = await client.get("/parts/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    listed = (await client.get("/parts")).json()
+    assert exported == listed
+
+
+@pytest.mark.asyncio
+async def test_export_parts_csv(client: AsyncClient):
+    for idx in range(3):
+        await part_factory(client, idx)
+
+    response = await client.get("/parts/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["part_number"] for row in rows] == ["TEST-PART-001", "TEST-PART-002", "TEST-PART-003"]
+    assert rows[0]["price"] == "100.00"
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock(client: AsyncClient):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+
+    response = await client.post(f"/parts/{part_id}/stock", json={"delta": -4})
+    assert response.status_code == 200
+    assert response.json()["quantity"] == 6
+
+    response = await client.post(f"/parts/{part_id}/stock", json={"delta": 5})
+    assert response.json()["quantity"] == 11
+    assert (await client.get(f"/parts/{part_id}")).json()["quantity"] == 11
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock_returns_response_columns(client: AsyncClient, session: AsyncSession):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+
+    # Also what the broker publishes, internal columns must not be in it
+    assert (await adjust_stock(part_id, 1, session))._fields == PART_FIELDS
+    result = await adjust_stock_batch([StockAdjustmentItem(part_id=part_id, delta=1)], session)
+    assert result.applied[0].quantity == 12
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock_below_zero(client: AsyncClient):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+
+    response = await client.post(f"/parts/{part_id}/stock", json={"delta": -11})
+    assert response.status_code == 409
+    assert response.json()["detail"] == f"Insufficient stock for part with id '{part_id}'"
+    assert (await client.get(f"/parts/{part_id}")).json()["quantity"] == 10
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock_not_found(client: AsyncClient):
+    response = await client.post("/parts/999999/stock", json={"delta": 1})
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_adjust_stock_batch(client: AsyncClient):
+    for idx in range(3):
+        await part_factory(client, idx)
+
+    response = await client.post("/parts/stock", json=[
+        {"part_id": 1, "delta": -5},
+        {"part_id": 2, "delta": -100},
+        {"part_id": 1, "delta": -5},
+        {"part_id": 999, "delta": 1},
+        {"part_id": 3, "delta": 3},
+    ])
+    assert response.status_code == 200
+    data = response.json()
+    assert [(part["id"], part["quantity"]) for part in data["applied"]] == [(1, 0), (3, 15)]
+    assert data["rejected"] == [
+        {"part_id": 2, "detail": "Insufficient stock for part with id '2'"},
+        {"part_id": 999, "detail": "Part with id '999' not found"},
+    ]
+    assert (await client.get("/parts/2")).json()["quantity"] == 11
+
+
+@pytest.mark.asyncio
+async def test_get_part_etag(client: AsyncClient):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+
+    response = await client.get(f"/parts/{part_id}")
+    first_tag = response.headers["ETag"]
+    assert first_tag == f'"1-{response.json()["created_at"]}"'
+
+    response = await client.get(f"/parts/{part_id}", headers={"If-None-Match": first_tag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    await client.patch(f"/parts/{part_id}", json={"quantity": 1})
+    response = await client.get(f"/parts/{part_id}", headers={"If-None-Match": first_tag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"2-{response.json()["created_at"]}"'
+
+
+@pytest.mark.asyncio
+async def test_update_part_if_match(client: AsyncClient):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+    first_tag = (await client.get(f"/parts/{part_id}")).headers["ETag"]
+
+    response = await client.patch(f"/parts/{part_id}", json={"quantity": 1}, headers={"If-Match": first_tag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"2-{response.json()["created_at"]}"'
+    assert response.json()["quantity"] == 1
+
+    response = await client.put(f"/parts/{part_id}", json=valid_part_payload, headers={"If-Match": first_tag})
+    assert response.status_code == 412
+    assert response.json()["detail"] == f"Part with id '{part_id}' has been modified"
+    assert (await client.get(f"/parts/{part_id}")).json()["quantity"] == 1
+
+    response = await client.put(f"/parts/{part_id}", json=valid_part_payload, headers={"If-Match": "*"})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"3-{response.json()["created_at"]}"'
+
+
+@pytest.mark.asyncio
+async def test_etag_does_not_match_a_recreated_part(client: AsyncClient, session: AsyncSession):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+    old_tag = (await client.get(f"/parts/{part_id}")).headers["ETag"]
+    await client.delete(f"/parts/{part_id}")
+
+    # SQLite hands the deleted id out again, here with a different creation time
+    await client.post("/parts", json=valid_part_payload)
+    await session.execute(update(Part).where(Part.id == part_id).values(created_at=datetime(2000, 1, 1)))
+    await session.commit()
+
+    response = await client.get(f"/parts/{part_id}", headers={"If-None-Match": old_tag})
+    assert (response.status_code, response.json()["version"]) == (200, 1)
+    response = await client.patch(f"/parts/{part_id}", json={"quantity": 1}, headers={"If-Match": old_tag})
+    assert response.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_empty_patch_writes_nothing(client: AsyncClient):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+    response = await client.get(f"/parts/{part_id}")
+    tag, part = response.headers["ETag"], response.json()
+    changes = (await client.get("/parts/changes", params={"since": 0})).json()
+
+    response = await client.patch(f"/parts/{part_id}", json={}, headers={"If-Match": tag})
+    assert (response.status_code, response.headers["ETag"], response.json()) == (200, tag, part)
+    assert (await client.get("/parts/changes", params={"since": 0})).json() == changes
+
+    response = await client.patch(f"/parts/{part_id}", json={}, headers={"If-Match": '"7-2000-01-01T00:00:00"'})
+    assert response.status_code == 412
+    assert (await client.patch("/parts/999999", json={})).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_update_part_if_match_not_found(client: AsyncClient):
+    response = await client.patch("/parts/999999", json={"quantity": 1}, headers={"If-Match": '"1"'})
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_writes_bump_version(client: AsyncClient):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+
+    await client.post(f"/parts/{part_id}/stock", json={"delta": 1})
+    await client.post("/parts/bulk", json=[valid_part_payload])
+    response = await client.get(f"/parts/{part_id}")
+    assert response.json()["version"] == 3
+
+
+@pytest.mark.asyncio
+async def test_warm_up_changes_nothing(client: AsyncClient, session: AsyncSession):
+    response = await client.post("/parts", json=valid_part_payload)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0])
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        await warm_up(session)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", capture)
+    assert set(statements) == {"SELECT"}
+
+    part = (await client.get(f"/parts/{response.json()['id']}")).json()
+    assert part["quantity"] == valid_part_payload["quantity"]
+    assert part["version"] == response.json()["version"]
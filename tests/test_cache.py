@@ -0,0 +1,141 @@
+import fnmatch
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache import MemoryCache, PartCache, RedisCache, part_cache
+from src.models import Part
+
+valid_part_payload = {
+    "part_number": "TEST-PART-001",
+    "description": "Test part",
+    "price": 100.0,
+    "quantity": 10
+}
+
+
+class LocalRedis:
+    """ Stand-in for `redis.asyncio.Redis`, implementing the calls RedisCache makes. """
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def scan_iter(self, match):
+        for key in list(self.data):
+            if fnmatch.fnmatch(key, match):
+                yield key
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_size=2, ttl=60)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    assert await cache.get("a") == 1
+    await cache.set("c", 3)
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == 1
+    assert await cache.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_expires_entries():
+    cache = MemoryCache(ttl=-1)
+    await cache.set("a", 1)
+    assert await cache.get("a") is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_cache_round_trip():
+    cache = PartCache(RedisCache(client=LocalRedis()))
+    await cache.set(1, "v1", {"id": 1})
+    assert await cache.get(1) == {"version": "v1", "part": {"id": 1}}
+
+    await cache.invalidate(1)
+    assert await cache.get(1) is None
+
+    await cache.set(2, "v1", {"id": 2})
+    await cache.clear()
+    assert await cache.get(2) is None
+
+
+@pytest.mark.asyncio
+async def test_stats_computed_during_a_write_are_not_stored():
+    cache = PartCache(MemoryCache())
+    generation = cache.stats_generation
+    await cache.set_stats("10", {"parts": 1}, generation)
+    assert await cache.get_stats("10") == {"parts": 1}
+
+    generation = cache.stats_generation
+    await cache.invalidate_stats()
+    await cache.set_stats("10", {"parts": 2}, generation)
+    assert await cache.get_stats("10") is None
+
+
+@pytest.mark.asyncio
+async def test_get_part_is_cached(client: AsyncClient):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+    before = (await client.get("/cache/stats")).json()
+
+    first = await client.get(f"/parts/{part_id}")
+    second = await client.get(f"/parts/{part_id}")
+    assert first.json() == second.json()
+
+    after = (await client.get("/cache/stats")).json()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_update_and_delete_invalidate_cache(client: AsyncClient):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+    await client.get(f"/parts/{part_id}")
+
+    await client.patch(f"/parts/{part_id}", json={"quantity": 1})
+    assert await part_cache.get(part_id) is None
+    assert (await client.get(f"/parts/{part_id}")).json()["quantity"] == 1
+
+    await client.delete(f"/parts/{part_id}")
+    assert (await client.get(f"/parts/{part_id}")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_cache_detects_writes_from_other_workers(client: AsyncClient, session: AsyncSession):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+    await client.get(f"/parts/{part_id}")
+
+    # Another worker writes the row without touching this worker's cache
+    await session.execute(
+        update(Part).where(Part.id == part_id).values(quantity=3, version=Part.version + 1)
+    )
+    await session.commit()
+
+    before = (await client.get("/cache/stats")).json()
+    assert (await client.get(f"/parts/{part_id}")).json()["quantity"] == 3
+    after = (await client.get("/cache/stats")).json()
+    assert after["stale"] - before["stale"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stats_detect_writes_from_other_workers(client: AsyncClient, session: AsyncSession):
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+    assert (await client.get("/parts/stats")).json()["total_quantity"] == 10
+
+    # Another worker writes the row without touching this worker's cache
+    await session.execute(update(Part).where(Part.id == part_id).values(quantity=3))
+    await session.commit()
+
+    assert (await client.get("/parts/stats")).json()["total_quantity"] == 3
@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from src.events import Broker, ChangeFeedBroker, Subscriber, broker, part_event, sse_stream, websocket_stream
+from tests.conftest import TestSessionLocal
+
+valid_part_payload = {
+    "part_number": "TEST-PART-001",
+    "description": "Test part",
+    "price": 100.0,
+    "quantity": 10
+}
+
+
+def stock_event(part_id: int, quantity: int) -> dict:
+    return part_event(part_id, {"id": part_id, "quantity": quantity})
+
+
+class LocalWebSocket:
+    """ Stand-in for a starlette WebSocket, the client side is driven through queues. """
+
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = asyncio.Queue()
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_text(self, data):
+        await self.sent.put(json.loads(data))
+
+
+@pytest.mark.asyncio
+async def test_subscriber_coalesces_events_per_part():
+    subscriber = Subscriber()
+    subscriber.offer(stock_event(1, 5))
+    subscriber.offer(stock_event(2, 5))
+    subscriber.offer(stock_event(1, 4))
+
+    events = await subscriber.get(timeout=0)
+    assert [(event["part_id"], event["part"]["quantity"]) for event in events] == [(1, 4), (2, 5)]
+    assert await subscriber.get(timeout=0) == []
+
+
+@pytest.mark.asyncio
+async def test_subscriber_overflow():
+    subscriber = Subscriber(max_pending=2)
+    for part_id in range(1, 5):
+        subscriber.offer(stock_event(part_id, 1))
+
+    events = await subscriber.get(timeout=0)
+    assert events[0] == {"type": "overflow", "dropped": 2}
+    assert [event["part_id"] for event in events[1:]] == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_subscriber_filters():
+    subscriber = Subscriber(part_ids={1}, low_stock_below=5)
+    subscriber.offer(stock_event(1, 50))
+    subscriber.offer(stock_event(2, 50))
+    subscriber.offer(stock_event(3, 4))
+    assert [event["part_id"] for event in await subscriber.get(timeout=0)] == [1, 3]
+
+    # Restocked once more, then no longer reported
+    subscriber.offer(stock_event(3, 10))
+    assert [event["part_id"] for event in await subscriber.get(timeout=0)] == [3]
+    subscriber.offer(stock_event(3, 11))
+    assert await subscriber.get(timeout=0) == []
+
+
+@pytest.mark.asyncio
+async def test_sse_stream(client: AsyncClient):
+    response = await client.post("/parts", json=valid_part_payload)
+    part_id = response.json()["id"]
+
+    stream = sse_stream(broker, {part_id}, None, keepalive=0.01)
+    assert await anext(stream) == ": keep-alive\n\n"
+    assert len(broker.subscribers) == 1
+
+    await client.post(f"/parts/{part_id}/stock", json={"delta": -3})
+    await client.patch(f"/parts/{part_id}", json={"price": 1.5})
+    message = await anext(stream)
+    assert message.startswith("event: part\ndata: ")
+    data = json.loads(message.split("data: ", 1)[1])
+    assert (data["part"]["quantity"], data["part"]["price"]) == (7, 1.5)
+
+    await client.delete(f"/parts/{part_id}")
+    data = json.loads((await anext(stream)).split("data: ", 1)[1])
+    assert (data["part_id"], data["deleted"], data["part"]) == (part_id, True, None)
+
+    await stream.aclose()
+    assert not broker.subscribers
+
+
+@pytest.mark.asyncio
+async def test_websocket_stream():
+    local_broker = Broker()
+    websocket = LocalWebSocket()
+    task = asyncio.create_task(websocket_stream(local_broker, None, 5, websocket))
+    await asyncio.sleep(0)
+
+    local_broker.publish(1, {"id": 1, "part_number": "A", "price": 1, "quantity": 2, "version": 1,
+                             "created_at": "2026-01-01T00:00:00"})
+    event = await asyncio.wait_for(websocket.sent.get(), 1)
+    assert (event["type"], event["part_id"], event["part"]["quantity"]) == ("part", 1, 2)
+
+    await websocket.incoming.put({"type": "websocket.disconnect"})
+    await asyncio.wait_for(task, 1)
+    assert not local_broker.subscribers
+
+
+@pytest.mark.asyncio
+async def test_bulk_writes_are_published(client: AsyncClient):
+    await client.post("/parts", json=valid_part_payload)
+    subscriber = broker.subscribe()
+    try:
+        await client.post("/parts/bulk", json=[
+            {**valid_part_payload, "quantity": 4},
+            {**valid_part_payload, "part_number": "BULK-001", "quantity": 1},
+        ])
+        events = await subscriber.get(timeout=0)
+        assert [(event["part"]["part_number"], event["part"]["quantity"]) for event in events] == [
+            ("TEST-PART-001", 4), ("BULK-001", 1)
+        ]
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+@pytest.mark.asyncio
+async def test_change_feed_broker_sees_writes_from_other_workers(client: AsyncClient):
+    changes_broker = ChangeFeedBroker(TestSessionLocal, poll_interval=0.01)
+    subscriber = changes_broker.subscribe(low_stock_below=5)
+    try:
+        while changes_broker._since is None:
+            await asyncio.sleep(0.01)
+
+        # Written through the API, whose broker is not this one
+        await client.post("/parts", json={**valid_part_payload, "quantity": 3})
+        await client.post("/parts/bulk", json=[{**valid_part_payload, "part_number": "BULK-001", "quantity": 1}])
+
+        events = []
+        while len(events) < 2:
+            events.extend(await subscriber.get(timeout=1))
+        assert [event["part"]["part_number"] for event in events] == ["TEST-PART-001", "BULK-001"]
+    finally:
+        changes_broker.unsubscribe(subscriber)
+        await changes_broker.close()
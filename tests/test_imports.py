@@ -0,0 +1,147 @@
+import copy
+import os
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+
+from src.imports import ImportRunner, parse_batch
+from src.models import ImportJob
+from tests.conftest import TestSessionLocal
+
+
+SUPPLIER_CSV = (
+    "Part_Number,Price,Quantity,Description,Supplier\n"
+    "IMP-001,1.50,10,First,acme\n"
+    'IMP-002,2.50,20,"Second,\nover two lines",acme\n'
+    "IMP-003,-1,5,Negative price,acme\n"
+    "IMP-004,4.00,40,,acme\n"
+    "IMP-005,5.00\n"
+    "IMP-001,1.75,11,First again,acme\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def import_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.imports.IMPORT_DIR", str(tmp_path / "imports"))
+
+
+async def upload(client: AsyncClient, content: str, on_conflict: str = "update"):
+    return await client.post(
+        f"/imports?on_conflict={on_conflict}",
+        files={"file": ("supplier.csv", content.encode(), "text/csv")},
+    )
+
+
+def test_parse_batch_resumes_at_offset(tmp_path):
+    path = tmp_path / "supplier.csv"
+    path.write_text(SUPPLIER_CSV)
+
+    first = parse_batch(str(path), 0, 1, 3)
+    assert [line for line, _ in first.parts] == [2, 3]
+    assert first.parts[1][1]["description"] == "Second,\nover two lines"
+    assert first.errors[0][:2] == (5, "IMP-003")
+    assert first.last_line == 5 and not first.eof
+
+    rest = parse_batch(str(path), first.byte_offset, first.last_line, 100)
+    assert [(line, fields["part_number"]) for line, fields in rest.parts] == [(6, "IMP-004"), (8, "IMP-001")]
+    assert rest.errors == [(7, None, "Expected 5 columns, got 2")]
+    assert rest.eof
+
+
+@pytest.mark.asyncio
+async def test_import_job(client: AsyncClient):
+    response = await upload(client, SUPPLIER_CSV)
+    assert response.status_code == 202
+    job = response.json()
+    assert (job["status"], job["bytes_total"]) == ("pending", len(SUPPLIER_CSV.encode()))
+    assert response.headers["Location"] == f"/imports/{job['id']}"
+
+    # Parsed in a worker process, like in production
+    runner = ImportRunner(TestSessionLocal, workers=1, batch_size=3)
+    try:
+        assert await runner.run_pending() == 1
+    finally:
+        await runner.close()
+
+    job = (await client.get(f"/imports/{job['id']}")).json()
+    assert job["status"] == "done"
+    assert job["byte_offset"] == job["bytes_total"]
+    assert (job["rows_processed"], job["created"], job["updated"], job["rejected"]) == (6, 3, 1, 2)
+    assert [(error["line"], error["part_number"]) for error in job["errors"]] == [(5, "IMP-003"), (7, None)]
+
+    parts = {part["part_number"]: part for part in (await client.get("/parts")).json()}
+    assert sorted(parts) == ["IMP-001", "IMP-002", "IMP-004"]
+    assert (parts["IMP-001"]["price"], parts["IMP-001"]["description"]) == (1.75, "First again")
+
+    page = (await client.get(f"/imports/{job['id']}?errors_after=5")).json()
+    assert [error["line"] for error in page["errors"]] == [7]
+
+
+@pytest.mark.asyncio
+async def test_import_rejects_existing_parts(client: AsyncClient):
+    await client.post("/parts", json={"part_number": "IMP-004", "price": 1, "quantity": 1})
+    job_id = (await upload(client, SUPPLIER_CSV, on_conflict="reject")).json()["id"]
+    await ImportRunner(TestSessionLocal, workers=0).run_pending()
+
+    job = (await client.get(f"/imports/{job_id}")).json()
+    assert (job["created"], job["updated"], job["rejected"]) == (2, 0, 3)
+    assert job["errors"][1] == {"line": 6, "part_number": "IMP-004",
+                                "detail": "Part with part_number 'IMP-004' already exists"}
+
+
+@pytest.mark.asyncio
+async def test_import_invalid_file(client: AsyncClient):
+    response = await upload(client, "sku,cost\nA,1\n")
+    assert response.status_code == 400
+    assert "missing columns part_number, price, quantity" in response.json()["detail"]
+    assert (await client.get("/imports/1")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_import_resumes_after_crash(client: AsyncClient):
+    job_id = (await upload(client, SUPPLIER_CSV)).json()["id"]
+
+    # The first worker writes one batch, then dies
+    crashed = ImportRunner(TestSessionLocal, workers=0, batch_size=3)
+    job = await crashed.claim()
+    written = await crashed._write(job, await crashed._parse(job, 0, 1))
+    assert [part.part_number for part in written] == ["IMP-001", "IMP-002"]
+    assert await ImportRunner(TestSessionLocal, workers=0).claim() is None
+
+    async with TestSessionLocal() as session:
+        await session.execute(update(ImportJob).values(heartbeat_at=ImportJob.created_at))
+        await session.commit()
+    assert await ImportRunner(TestSessionLocal, workers=0, stale_seconds=0).run_pending() == 1
+
+    job = (await client.get(f"/imports/{job_id}")).json()
+    assert (job["status"], job["rows_processed"], job["created"], job["updated"], job["rejected"]) == (
+        "done", 6, 3, 1, 2
+    )
+    assert [error["line"] for error in job["errors"]] == [5, 7]
+
+
+@pytest.mark.asyncio
+async def test_forked_runners_do_not_share_claims(client: AsyncClient, monkeypatch):
+    await upload(client, SUPPLIER_CSV)
+    # Built in the master and forked into two workers, as with preload_app
+    runner = ImportRunner(TestSessionLocal, workers=0, batch_size=3, stale_seconds=0)
+    runner.worker_id
+    slow, forked = runner, copy.copy(runner)
+    job = await slow.claim()
+
+    async with TestSessionLocal() as session:
+        await session.execute(update(ImportJob).values(heartbeat_at=ImportJob.created_at))
+        await session.commit()
+    pid = os.getpid()
+    with monkeypatch.context() as m:
+        m.setattr("src.imports.os.getpid", lambda: pid + 1)
+        taken = await forked.claim()
+    assert taken.claimed_by != job.claimed_by
+
+    # The slow worker can neither write the job nor hand it back
+    assert await slow._write(job, await slow._parse(job, 0, 1)) is None
+    await slow._release(job)
+    async with TestSessionLocal() as session:
+        current = await session.get(ImportJob, job.id)
+    assert (current.status, current.claimed_by, current.byte_offset) == ("running", taken.claimed_by, 0)
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import AsyncClient
+from httpx._transports.asgi import ASGITransport
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import get_session
+from src.instrumentation import Histogram, LoopLagMonitor, instrument
+from src.routers import router
+from tests.conftest import TEST_DATABASE_URL
+
+
+@pytest_asyncio.fixture
+async def instrumented():
+    engine = create_async_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_session():
+        async with session_factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_session] = override_get_session
+    metrics = instrument(app, [engine], slow_query_ms=0)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+        yield client, metrics
+    await engine.dispose()
+
+
+def test_histogram_render():
+    histogram = Histogram("latency", "Latency.", ("route",), (0.1, 1.0))
+    histogram.observe(("/a",), 0.1)
+    histogram.observe(("/a",), 0.5)
+    histogram.observe(("/a",), 3)
+
+    assert histogram.render() == [
+        "# HELP latency Latency.",
+        "# TYPE latency histogram",
+        'latency_bucket{route="/a",le="0.1"} 1',
+        'latency_bucket{route="/a",le="1.0"} 2',
+        'latency_bucket{route="/a",le="+Inf"} 3',
+        'latency_sum{route="/a"} 3.6',
+        'latency_count{route="/a"} 3',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header(instrumented):
+    client, metrics = instrumented
+    response = await client.post("/parts", json={"part_number": "PN-1", "price": 1, "quantity": 1})
+    assert response.status_code == 201
+
+    response = await client.get("/parts")
+    server_timing = response.headers["Server-Timing"]
+    assert 'desc="1 queries"' in server_timing
+    assert "app;dur=" in server_timing
+    assert metrics.queries_total >= 2
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(instrumented):
+    client, _ = instrumented
+    await client.get("/parts/1")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert (
+        'partventory_http_request_duration_seconds_count{method="GET",route="/parts/{part_id}",status="404"} 1'
+        in body
+    )
+    assert 'partventory_http_request_db_queries_bucket{method="GET",route="/parts/{part_id}",status="404",le="1"} 1' in body
+
+
+def test_histogram_render_without_labels():
+    histogram = Histogram("lag", "Lag.", (), (0.1,))
+    histogram.observe((), 0.05)
+    assert histogram.render()[2:] == ['lag_bucket{le="0.1"} 1', 'lag_bucket{le="+Inf"} 1', "lag_sum{} 0.05",
+                                      "lag_count{} 1"]
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor():
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.02)
+        # Holds the event loop, like inline CPU work would
+        time.sleep(0.05)
+        await asyncio.sleep(0.02)
+    finally:
+        await monitor.close()
+    assert monitor.max >= 0.03
+    assert 'partventory_event_loop_lag_seconds_bucket{le="0.025"}' in "\n".join(monitor.histogram.render())
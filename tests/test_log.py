@@ -0,0 +1,72 @@
+import json
+import logging
+import queue
+
+import pytest
+from httpx import AsyncClient
+
+from src.log import JsonFormatter, NonBlockingQueueHandler, SamplingFilter, parse_sampling
+
+
+def make_record(name="src.service", level=logging.INFO, msg="Fetched %d parts", args=(3,), **extra):
+    record = logging.makeLogRecord({"name": name, "levelno": level, "levelname": logging.getLevelName(level),
+                                    "msg": msg, "args": args})
+    record.__dict__.update(extra)
+    return record
+
+
+def test_parse_sampling():
+    assert parse_sampling("src.service=0.1, httpx=0") == {"src.service": 0.1, "httpx": 0.0}
+    assert parse_sampling("") == {}
+
+
+def test_sampling_filter():
+    sampling = SamplingFilter({"src": 0.0, "src.cache": 1.0})
+    assert not sampling.filter(make_record("src.service"))
+    assert sampling.filter(make_record("src.cache"))
+    assert sampling.filter(make_record("httpx"))
+    assert sampling.filter(make_record("src.service", level=logging.WARNING))
+
+
+def test_queue_handler_does_not_format_in_caller():
+    class Filters:
+        formatted = 0
+
+        def __repr__(self):
+            Filters.formatted += 1
+            return "Filters()"
+
+    handler = NonBlockingQueueHandler(queue.Queue())
+    handler.handle(make_record(msg="Fetching parts with filters: %r", args=(Filters(),)))
+
+    record = handler.queue.get_nowait()
+    assert Filters.formatted == 0
+    assert record.getMessage() == "Fetching parts with filters: Filters()"
+
+
+def test_queue_handler_drops_when_full():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert handler.dropped == 1
+
+
+def test_json_formatter():
+    data = json.loads(JsonFormatter().format(make_record(part_id=7)))
+    assert data["level"] == "INFO"
+    assert data["logger"] == "src.service"
+    assert data["message"] == "Fetched 3 parts"
+    assert data["part_id"] == 7
+
+
+@pytest.mark.asyncio
+async def test_list_parts_logs_filters_at_debug(client: AsyncClient, caplog):
+    with caplog.at_level(logging.INFO, logger="src.service"):
+        await client.get("/parts", params={"price_min": 5, "limit": 10})
+    assert not [record for record in caplog.records if record.name == "src.service"]
+
+    with caplog.at_level(logging.DEBUG, logger="src.service"):
+        await client.get("/parts", params={"price_min": 5, "limit": 10})
+    record = next(record for record in caplog.records if record.msg.startswith("Fetching parts"))
+    assert record.getMessage() == "Fetching parts: limit=10 price_min=5.0"
+    assert all(isinstance(arg, str) for arg in record.args)
@@ -0,0 +1,68 @@
+import json
+import threading
+
+import pytest
+from httpx import AsyncClient
+
+from src.offload import Offloader, offloader
+from src.serialization import validate_bulk_parts
+
+
+def current_thread_name() -> str:
+    return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_offloader_thresholds():
+    offload = Offloader("thread", workers=1, min_items=10, min_bytes=100)
+    try:
+        assert await offload.run(current_thread_name, items=9, size=99) == threading.current_thread().name
+        assert (await offload.run(current_thread_name, items=10)).startswith("offload")
+        assert (await offload.run(current_thread_name, size=100)).startswith("offload")
+        assert offload.stats() == {"inline": 1, "offloaded": 2}
+    finally:
+        offload.close()
+
+
+@pytest.mark.asyncio
+async def test_offloader_inline_mode():
+    offload = Offloader("inline", min_items=0, min_bytes=0)
+    assert await offload.run(current_thread_name, items=10_000) == threading.current_thread().name
+
+
+def test_offloader_unknown_mode():
+    with pytest.raises(ValueError):
+        Offloader("fibers")
+
+
+@pytest.mark.asyncio
+async def test_offloader_process_pool():
+    offload = Offloader("process", workers=1, min_items=0, min_bytes=0)
+    try:
+        parts, errors = await offload.run(validate_bulk_parts, b'[{"part_number": "A", "price": 1, "quantity": 2}]')
+        assert errors is None and parts[0]["part_number"] == "A"
+
+        parts, errors = await offload.run(validate_bulk_parts, b'[{"part_number": "A", "price": -1, "quantity": 2}]')
+        assert parts is None and errors[0]["loc"] == (0, "price")
+    finally:
+        offload.close()
+
+
+@pytest.mark.asyncio
+async def test_bulk_offloaded(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(offloader, "min_items", 0)
+    monkeypatch.setattr(offloader, "min_bytes", 0)
+    payload = [{"part_number": f"OFF-{i}", "price": 1.5, "quantity": i} for i in range(3)]
+
+    response = await client.post("/parts/bulk", json=payload)
+    assert response.status_code == 200
+    assert response.json()["created"] == 3
+
+    response = await client.post("/parts/bulk", content=json.dumps([{**payload[0], "price": -1}]),
+                                 headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", 0, "price"]
+
+    response = await client.get("/parts/export")
+    assert len(response.text.splitlines()) == 3
+    assert offloader.stats()["offloaded"] >= 3
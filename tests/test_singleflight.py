@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import event
+
+from src.service import list_flight, part_flight
+from src.singleflight import SingleFlight
+from tests.conftest import test_engine
+
+valid_part_payload = {
+    "part_number": "TEST-PART-001",
+    "description": "Test part",
+    "price": 100.0,
+    "quantity": 10
+}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight(max_hold=1)
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(flight.do("key", call) for _ in range(10)))
+    assert results == [1] * 10
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "shared": 9, "timeouts": 0}
+
+    # Finished calls are not reused
+    assert await flight.do("key", call) == 2
+
+
+@pytest.mark.asyncio
+async def test_exceptions_are_shared():
+    flight = SingleFlight(max_hold=1)
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise KeyError("missing")
+
+    results = await asyncio.gather(*(flight.do("key", call) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, KeyError) for result in results)
+    assert flight.stats()["shared"] == 2
+
+
+@pytest.mark.asyncio
+async def test_followers_stop_waiting_after_max_hold():
+    flight = SingleFlight(max_hold=0.01)
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return "slow"
+
+    async def fast():
+        return "fast"
+
+    leader = asyncio.create_task(flight.do("key", slow))
+    await asyncio.sleep(0)
+    assert await flight.do("key", fast) == "fast"
+    assert flight.timeouts == 1
+
+    release.set()
+    assert await leader == "slow"
+
+
+@pytest.mark.asyncio
+async def test_followers_run_the_call_when_the_leader_is_cancelled():
+    flight = SingleFlight(max_hold=1)
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    leader = asyncio.create_task(flight.do("key", call))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flight.do("key", call))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == "done"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_queries(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(part_flight, "enabled", True)
+    monkeypatch.setattr(list_flight, "enabled", True)
+    part_id = (await client.post("/parts", json=valid_part_payload)).json()["id"]
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        responses = await asyncio.gather(*(client.get(f"/parts/{part_id}") for _ in range(20)))
+        assert {response.json()["id"] for response in responses} == {part_id}
+        part_queries = len(statements)
+
+        statements.clear()
+        responses = await asyncio.gather(*(
+            client.get("/parts", params={"order_by": "price", "limit": 10}) for _ in range(20)
+        ))
+        assert all(len(response.json()) == 1 for response in responses)
+        list_queries = len(statements)
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", capture)
+
+    # Usually a single query each, later arrivals may start a new one
+    assert part_queries < 5
+    assert list_queries < 5
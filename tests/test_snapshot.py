@@ -0,0 +1,82 @@
+import pytest
+from httpx import AsyncClient
+
+from src import snapshot
+from src.snapshot import PartSnapshot, open_snapshot, refresh_snapshot
+from tests.conftest import TestSessionLocal
+
+
+def parts_payload(count: int) -> list[dict]:
+    return [
+        {"part_number": f"SNAP-{i:03d}", "description": "Snapshot part", "price": i + 0.25, "quantity": i}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def snapshot_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "parts.snapshot")
+    monkeypatch.setattr("src.routers.SNAPSHOT_PATH", path)
+    return path
+
+
+@pytest.mark.asyncio
+async def test_snapshot_endpoint(client: AsyncClient, snapshot_path, tmp_path):
+    await client.post("/parts/bulk", json=parts_payload(3))
+
+    response = await client.get("/parts/snapshot")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == snapshot.MEDIA_TYPE
+    downloaded = tmp_path / "downloaded.snapshot"
+    downloaded.write_bytes(response.content)
+
+    with PartSnapshot(str(downloaded)) as parts:
+        assert len(parts) == 3
+        assert parts.seq == int(response.headers["X-Snapshot-Seq"])
+        assert list(parts.quantities) == [0, 1, 2]
+        assert list(parts.prices) == [0.25, 1.25, 2.25]
+        assert parts.part_number(2) == "SNAP-002"
+        assert parts.find(parts.ids[1]) == 1
+        assert parts.find(10_000) is None
+
+    response = await client.get("/parts/snapshot", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_snapshot_refresh_merges_changes(client: AsyncClient, snapshot_path, monkeypatch):
+    await client.post("/parts/bulk", json=parts_payload(4))
+    count, seq = await refresh_snapshot(TestSessionLocal, snapshot_path)
+    assert count == 4
+    with open_snapshot(snapshot_path) as parts:
+        ids = list(parts.ids)
+
+    await client.patch(f"/parts/{ids[1]}", json={"price": 9.5})
+    await client.post(f"/parts/{ids[2]}/stock", json={"delta": -2})
+    await client.delete(f"/parts/{ids[0]}")
+    await client.post("/parts", json={"part_number": "SNAP-NEW", "price": 1, "quantity": 7})
+
+    async def no_rebuild(*args):
+        raise AssertionError("Snapshot rebuilt instead of merged")
+
+    monkeypatch.setattr(snapshot, "_build", no_rebuild)
+    new_count, new_seq = await refresh_snapshot(TestSessionLocal, snapshot_path)
+    assert new_count == 4 and new_seq > seq
+
+    with open_snapshot(snapshot_path) as parts:
+        assert list(parts.rows())[:3] == [
+            (ids[1], "SNAP-001", 9.5, 1),
+            (ids[2], "SNAP-002", 2.25, 0),
+            (ids[3], "SNAP-003", 3.25, 3),
+        ]
+        assert parts.part_number(3) == "SNAP-NEW"
+
+    # Nothing changed since, the file is left as it is
+    assert await refresh_snapshot(TestSessionLocal, snapshot_path) == (new_count, new_seq)
+
+
+def test_open_snapshot_missing_or_invalid(tmp_path):
+    assert open_snapshot(str(tmp_path / "missing.snapshot")) is None
+    invalid = tmp_path / "invalid.snapshot"
+    invalid.write_bytes(b"\0" * 64)
+    assert open_snapshot(str(invalid)) is None